@@ -0,0 +1,165 @@
+"""
+Runs the MIEDA benchmark suite headless. For every workload and input size, the wall time of Merge.union (best of
+several repeats) and its peak traced memory are recorded, and a power law is fitted to the timings so that the
+scaling of each workload is reported as an exponent (1.0 is linear). Results can be stored as a baseline and later
+runs compared against it, flagging any workload which became slower than the allowed tolerance. By default, results
+are compared against benchmarks/baseline.json, a reference run which should be recorded again with --save on the
+machine the suite runs on, since wall times differ between machines.
+
+    python benchmarks/run.py                                      # compare against benchmarks/baseline.json
+    python benchmarks/run.py --save benchmarks/baseline.json      # record the baseline on this machine
+    python benchmarks/run.py --baseline other.json                # compare against another baseline
+    python benchmarks/run.py --baseline ""                        # only print the results
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mieda.intervals import Merge  # noqa: E402
+from workloads import WORKLOADS  # noqa: E402
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def measure(intervals: list, engine: str, repeats: int) -> dict:
+    """
+    Measures a single merge.
+    :param intervals: the intervals to merge.
+    :param engine: the engine passed to Merge.union.
+    :param repeats: the number of timed repeats, of which the fastest is kept.
+    :return: a dictionary with the wall time in seconds, the peak memory in bytes and the number of merged intervals.
+    """
+
+    seconds = math.inf
+    for _ in range(repeats):
+        copies = [dict(i) for i in intervals]
+        began = time.perf_counter()
+        out = Merge.union(copies, engine=engine)
+        seconds = min(seconds, time.perf_counter() - began)
+
+    copies = [dict(i) for i in intervals]
+    tracemalloc.start()
+    Merge.union(copies, engine=engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": seconds, "peak_bytes": peak, "segments": len(out)}
+
+
+def fit_exponent(sizes: list, seconds: list) -> float:
+    """
+    Fits time = c * n^k by least squares on a log-log scale.
+    :param sizes: the input sizes.
+    :param seconds: the wall time for each input size.
+    :return: the fitted exponent k, or NaN if there are fewer than two usable points.
+    """
+
+    points = [(math.log(n), math.log(s)) for n, s in zip(sizes, seconds) if n > 0 and s > 0]
+    if len(points) < 2:
+        return math.nan
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return math.nan
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def run(workloads: list, sizes: list, engine: str, repeats: int) -> dict:
+    """
+    Runs every workload at every input size.
+    :param workloads: the names of the workloads to run.
+    :param sizes: the input sizes.
+    :param engine: the engine passed to Merge.union.
+    :param repeats: the number of timed repeats per measurement.
+    :return: a dictionary of results keyed by workload name.
+    """
+
+    results = dict()
+    for name in workloads:
+        measurements = dict()
+        for n in sizes:
+            measurements[str(n)] = measure(WORKLOADS[name](n), engine, repeats)
+            print("{:<34} n={:<8} {:>10.4f}s {:>10.1f}KiB {:>8} segments".format(
+                name, n, measurements[str(n)]["seconds"], measurements[str(n)]["peak_bytes"] / 1024,
+                measurements[str(n)]["segments"]))
+        exponent = fit_exponent(sizes, [measurements[str(n)]["seconds"] for n in sizes])
+        print("{:<34} fitted complexity: O(n^{:.2f})".format(name, exponent))
+        results[name] = {"engine": engine, "sizes": measurements, "exponent": exponent}
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares results against a baseline.
+    :param results: the results of the current run.
+    :param baseline: the results of a previous run.
+    :param tolerance: the allowed relative increase in wall time or peak memory, e.g. 0.25 for 25%.
+    :return: a list of messages describing every regression.
+    """
+
+    regressions = list()
+    for name, result in results.items():
+        for n, current in result["sizes"].items():
+            previous = baseline.get(name, {}).get("sizes", {}).get(n)
+            if previous is None:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append("{} n={}: {} increased from {:.6g} to {:.6g}".format(
+                        name, n, metric, previous[metric], current[metric]))
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Runs the MIEDA benchmark suite.")
+    parser.add_argument("--workloads", nargs="+", default=sorted(WORKLOADS), choices=sorted(WORKLOADS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 2000, 4000, 8000, 16000])
+    parser.add_argument("--engine", default="sweep", choices=["sweep", "graph"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--save", help="write the results to this file as a baseline")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="compare the results against the baseline in this file (default benchmarks/baseline.json, "
+                             "or none if empty)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the allowed relative increase over the baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    # the baseline is read first, as it may be the file the results are saved to
+    baseline = None
+    if args.baseline == BASELINE and not os.path.exists(BASELINE):
+        print("No baseline at {} - record one with --save.".format(BASELINE), file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run(args.workloads, args.sizes, args.engine, args.repeats)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION: " + r)
+        if regressions:
+            return 1
+        print("No regressions against {}.".format(args.baseline))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Input generators for the MIEDA benchmark suite. Every generator is deterministic for a given size (and seed), so that
+timings can be compared across runs and against a stored baseline.
+"""
+
+import datetime
+import os
+import random
+
+
+ORIGIN = datetime.datetime(2020, 1, 1, 1, 0, 0)
+
+# the six overlap scenarios of tests/test_merge.py, as (A start, A finish, B start, B finish) offsets in hours
+SCENARIOS = {
+    "b_after_a": (0, 72, 24, 120),
+    "b_after_a_same_finish": (0, 72, 24, 72),
+    "b_within_a": (0, 72, 24, 48),
+    "b_same_start_ends_after": (0, 72, 0, 120),
+    "b_same_start_ends_before": (0, 72, 0, 48),
+    "b_same_as_a": (0, 72, 0, 72),
+}
+
+SHUTTLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data", "shuttle", "shuttle.trn")
+
+
+def scenario(name: str, n: int) -> list:
+    """
+    Tiles one of the overlap scenarios of the test suite into a chain of n intervals. Each pair of intervals is shifted
+    by two days from the previous pair, so consecutive pairs overlap each other as well.
+    :param name: the name of the scenario, one of SCENARIOS.
+    :param n: the number of intervals to generate.
+    :return: a list of intervals.
+    """
+
+    a_start, a_finish, b_start, b_finish = SCENARIOS[name]
+    intervals = list()
+    for j in range(n):
+        offset = (j // 2) * 48
+        start, finish = (a_start, a_finish) if j % 2 == 0 else (b_start, b_finish)
+        intervals.append({
+            "start": ORIGIN + datetime.timedelta(hours=offset + start),
+            "finish": ORIGIN + datetime.timedelta(hours=offset + finish),
+            "set_items": {str(j)}
+        })
+
+    return intervals
+
+
+def random_intervals(n: int, seed: int = 0, labels: int = 100) -> list:
+    """
+    Generates n intervals with uniformly distributed starts and durations of up to a day.
+    :param n: the number of intervals to generate.
+    :param seed: the seed of the random number generator.
+    :param labels: the number of distinct labels to draw from.
+    :return: a list of intervals.
+    """
+
+    rng = random.Random(seed)
+    intervals = list()
+    for _ in range(n):
+        start = ORIGIN + datetime.timedelta(minutes=rng.randrange(n * 60))
+        intervals.append({
+            "start": start,
+            "finish": start + datetime.timedelta(minutes=rng.randint(1, 24 * 60)),
+            "set_items": {str(rng.randrange(labels)) for _ in range(rng.randint(1, 3))}
+        })
+
+    return intervals
+
+
+def duplicate_intervals(n: int, seed: int = 0, windows: int = 10) -> list:
+    """
+    Generates n intervals dominated by identical fixed-size windows, as produced by windowed detectors.
+    :param n: the number of intervals to generate.
+    :param seed: the seed of the random number generator.
+    :param windows: the average number of intervals sharing each window.
+    :return: a list of intervals.
+    """
+
+    rng = random.Random(seed)
+    intervals = list()
+    for _ in range(n):
+        start = ORIGIN + datetime.timedelta(hours=rng.randrange(max(n // windows, 1)))
+        intervals.append({
+            "start": start,
+            "finish": start + datetime.timedelta(hours=1),
+            "set_items": {str(rng.randrange(50))}
+        })
+
+    return intervals
+
+
+def shuttle_intervals(n: int, path: str = SHUTTLE) -> list:
+    """
+    Derives intervals from the shuttle dataset. Samples are ordered by the time attribute, and for each of the eight
+    sensor attributes an interval is created for every run of samples above that sensor's median, labelled with the
+    sensor and the class of the first sample. Runs are repeated with a shifted time axis until n intervals exist.
+    :param n: the number of intervals to generate.
+    :param path: the path of the shuttle training set.
+    :return: a list of intervals.
+    """
+
+    with open(path) as f:
+        rows = sorted((list(map(int, line.split())) for line in f if line.strip()), key=lambda r: r[0])
+
+    runs = list()
+    for channel in range(1, 9):
+        values = sorted(r[channel] for r in rows)
+        median = values[len(values) // 2]
+        begin = None
+        for n_row, row in enumerate(rows):
+            if row[channel] > median and begin is None:
+                begin = n_row
+            elif row[channel] <= median and begin is not None:
+                if rows[begin][0] < row[0]:
+                    items = {"sensor_{}".format(channel), "class_{}".format(rows[begin][-1])}
+                    runs.append((rows[begin][0], row[0], items))
+                begin = None
+
+    period = rows[-1][0] - rows[0][0] + 1
+    intervals = list()
+    while len(intervals) < n:
+        shift = (len(intervals) // len(runs)) * period
+        for start, finish, items in runs[:n - len(intervals)]:
+            intervals.append({"start": start + shift, "finish": finish + shift, "set_items": set(items)})
+
+    return intervals
+
+
+WORKLOADS = dict(
+    [("scenario_" + name, lambda n, name=name: scenario(name, n)) for name in SCENARIOS] + [
+        ("random", random_intervals),
+        ("duplicates", duplicate_intervals),
+        ("shuttle", shuttle_intervals),
+    ]
+)
@@ -0,0 +1,126 @@
+"""
+========================================================================================================
+Copyright 2020, by the California Institute of Technology. ALL RIGHTS RESERVED.
+United States Government Sponsorship acknowledged. Any commercial use must be negotiated with the Office of Technology
+Transfer at the California Institute of Technology. This software may be subject to U.S. export control laws. By
+accepting this software, the user agrees to comply with all applicable U.S. export laws and regulations. User has the
+responsibility to obtain export licenses, or other export authority as may be required before exporting such
+information to foreign countries or providing access to foreign persons.
+========================================================================================================
+"""
+
+import argparse
+import datetime
+from heapq import merge
+from operator import itemgetter
+import os
+import sys
+
+
+def _merge(args: argparse.Namespace) -> int:
+    from mieda.external import IntervalWriter, detect_format, read_intervals, sort_intervals, union_stream
+
+    paths = args.files or ["-"]
+    formats = [args.format or ("jsonl" if p == "-" else detect_format(p)) for p in paths]
+    parse = datetime.datetime.fromisoformat if args.time == "iso" else None
+    fields = () if args.group is None else (args.group,)
+
+    streams = [sys.stdin if p == "-" else open(p, newline="") for p in paths]
+    try:
+        inputs = [
+            read_intervals(s, fmt=f, key=args.key, start=args.start, finish=args.finish, parse=parse,
+                           separator=args.separator, fields=fields)
+            for s, f in zip(streams, formats)
+        ]
+        # each input is sorted on its own, so several inputs are interleaved as they are read
+        intervals = inputs[0] if len(inputs) == 1 else merge(*inputs, key=itemgetter("start"))
+        if args.sort:
+            intervals = sort_intervals(intervals, chunk_size=args.chunk_size, directory=args.spill)
+
+        writer = IntervalWriter(sys.stdout, fmt=args.output_format or formats[0], key=args.key,
+                                separator=args.separator, fields=fields)
+        union_stream(intervals, writer.write, key=args.key, group=args.group, bitset=args.bitset,
+                     coalesce_equal=args.coalesce_equal)
+        sys.stdout.flush()
+    except ValueError as e:
+        hint = " (pass --sort to sort the input)" if "order" in str(e) else ""
+        print("mieda merge: error: {}{}".format(e, hint), file=sys.stderr)
+        return 1
+    except KeyError as e:
+        print("mieda merge: error: missing field {}".format(e), file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # the reader went away, e.g. 'head', so nothing more can be written
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        for s in streams:
+            if s is not sys.stdin:
+                s.close()
+
+    return 0
+
+
+def _serve(args: argparse.Namespace) -> int:
+    from mieda.server import serve
+    serve(host=args.host, port=args.port, path=args.socket, workers=args.workers, batch_size=args.batch_size,
+          linger=args.linger)
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+    """
+    Builds the parser of the 'mieda' command.
+    :return: an ArgumentParser with a subcommand for each mode.
+    """
+
+    p = argparse.ArgumentParser(prog="mieda", description="Merges intervals containing sets.")
+    commands = p.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    merge_ = commands.add_parser("merge", help="merge a stream of intervals",
+                                 description="Merges intervals read as JSON lines or CSV, sorted by their start "
+                                             "time, and writes merged intervals to stdout as they are finalized.")
+    merge_.add_argument("files", nargs="*", help="the files to read, each sorted by start time (default: stdin)")
+    merge_.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="the input format (default: from the file extension, or jsonl for stdin)")
+    merge_.add_argument("--output-format", choices=("jsonl", "csv"), default=None,
+                        help="the output format (default: the input format)")
+    merge_.add_argument("--key", default="set_items", help="the field containing the labels (default: %(default)s)")
+    merge_.add_argument("--start", default="start", help="the field containing the start (default: %(default)s)")
+    merge_.add_argument("--finish", default="finish", help="the field containing the finish (default: %(default)s)")
+    merge_.add_argument("--group", default=None, help="a field identifying groups which are merged separately")
+    merge_.add_argument("--separator", default=";", help="the string separating labels in CSV (default: %(default)s)")
+    merge_.add_argument("--time", choices=("raw", "iso"), default="raw",
+                        help="parse times as ISO 8601 timestamps, or keep them as read (default: %(default)s)")
+    merge_.add_argument("--bitset", action="store_true", help="carry labels through the merge as bitmasks")
+    merge_.add_argument("--coalesce-equal", action="store_true", help="coalesce adjacent intervals with equal labels")
+    merge_.add_argument("--sort", action="store_true", help="sort the input in bounded memory before merging")
+    merge_.add_argument("--chunk-size", type=int, default=100000,
+                        help="the number of intervals held in memory while sorting (default: %(default)s)")
+    merge_.add_argument("--spill", default=None, help="the directory in which to spill sorted runs")
+    merge_.set_defaults(run=_merge)
+
+    serve = commands.add_parser("serve", help="run a local merge service",
+                                description="Runs a local merge service which batches concurrent requests.")
+    serve.add_argument("--host", default="127.0.0.1", help="the address to listen on (default: %(default)s)")
+    serve.add_argument("--port", type=int, default=8765, help="the TCP port to listen on (default: %(default)s)")
+    serve.add_argument("--socket", default=None, help="the path of a Unix socket to listen on instead of a port")
+    serve.add_argument("--workers", type=int, default=None, help="the number of worker processes (default: CPUs)")
+    serve.add_argument("--batch-size", type=int, default=64,
+                       help="the maximum number of requests merged in a batch (default: %(default)s)")
+    serve.add_argument("--linger", type=float, default=0.002,
+                       help="the seconds to wait for more requests before merging a batch (default: %(default)s)")
+    serve.set_defaults(run=_serve)
+
+    return p
+
+
+def main(argv: list = None) -> int:
+    """
+    Runs the 'mieda' command.
+    :param argv: the arguments to parse. Defaults to the arguments of the process.
+    :return: the exit status.
+    """
+    args = parser().parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,270 @@
+"""
+========================================================================================================
+Copyright 2020, by the California Institute of Technology. ALL RIGHTS RESERVED.
+United States Government Sponsorship acknowledged. Any commercial use must be negotiated with the Office of Technology
+Transfer at the California Institute of Technology. This software may be subject to U.S. export control laws. By
+accepting this software, the user agrees to comply with all applicable U.S. export laws and regulations. User has the
+responsibility to obtain export licenses, or other export authority as may be required before exporting such
+information to foreign countries or providing access to foreign persons.
+========================================================================================================
+"""
+
+import csv
+import datetime
+from heapq import merge
+from itertools import islice
+import json
+from operator import itemgetter
+import os
+import pickle
+import tempfile
+from typing import Callable, Iterator
+
+from mieda.intervals import IncrementalMerge
+
+
+FORMATS = ("jsonl", "csv")
+
+
+def detect_format(path: str) -> str:
+    """
+    Infers the format of an interval file from its extension.
+    :param path: the path of the file.
+    :return: 'csv' for files ending in '.csv' and 'jsonl' otherwise.
+    """
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def parse_value(value: str):
+    """
+    Parses a value read from a CSV file as an integer or float where possible. Other values, such as ISO 8601
+    timestamps, are kept as strings, which order correctly as long as they share the same format.
+    :param value: the value to parse.
+    :return: the parsed value.
+    """
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def read_intervals(stream, fmt: str = "jsonl", key: str = "set_items", start: str = "start", finish: str = "finish",
+                   parse: Callable = None, separator: str = ";", fields: tuple = ()) -> Iterator[dict]:
+    """
+    Reads intervals from a stream of JSON lines or CSV rows.
+    :param stream: a text stream to read from.
+    :param fmt: the format of the stream, either 'jsonl' or 'csv'.
+    :param key: the field containing the labels of each interval. Labels are a list in JSON lines, where any other
+    value is read as a single label and null as no labels, and a string joined by 'separator' in CSV.
+    :param start: the field containing the start of each interval.
+    :param finish: the field containing the finish of each interval.
+    :param parse: a function applied to each start and finish. Defaults to parse_value for CSV, and to leaving the
+    values as they are for JSON lines.
+    :param separator: the string separating labels in CSV.
+    :param fields: other fields to copy from each row as they are, such as a group.
+    :return: a generator of intervals with the fields 'start', 'finish', 'key' and any other 'fields'.
+    """
+
+    if fmt == "csv":
+        rows = csv.DictReader(stream)
+        parse = parse_value if parse is None else parse
+    elif fmt == "jsonl":
+        rows = (json.loads(line) for line in stream if line.strip())
+    else:
+        raise ValueError("Unknown format '{}' - expected one of {}.".format(fmt, ", ".join(FORMATS)))
+
+    for row in rows:
+        items = row[key]
+        if fmt == "csv":
+            items = items.split(separator) if items else list()
+        elif items is None:
+            items = list()
+        elif not isinstance(items, list):
+            # a single label, which set() would otherwise split into characters
+            items = [items]
+        interval = {
+            "start": row[start] if parse is None else parse(row[start]),
+            "finish": row[finish] if parse is None else parse(row[finish]),
+            key: set(items)
+        }
+        for field in fields:
+            interval[field] = row[field]
+        yield interval
+
+
+def _encode(value):
+    # JSON has no timestamp type, so timestamps are written in ISO 8601
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class IntervalWriter:
+    """
+    Writes merged intervals to a stream of JSON lines or CSV rows, in the layout understood by read_intervals.
+    """
+
+    def __init__(self, stream, fmt: str = "jsonl", key: str = "set_items", separator: str = ";",
+                 fields: tuple = ()) -> None:
+        """
+        :param stream: a text stream to write to.
+        :param fmt: the format of the stream, either 'jsonl' or 'csv'.
+        :param key: the field containing the labels of each interval.
+        :param separator: the string joining labels in CSV.
+        :param fields: other fields to write after the labels, such as a group.
+        """
+        if fmt not in FORMATS:
+            raise ValueError("Unknown format '{}' - expected one of {}.".format(fmt, ", ".join(FORMATS)))
+        self.stream = stream
+        self.fmt = fmt
+        self.key = key
+        self.separator = separator
+        self.fields = tuple(fields)
+        self.written = 0
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(["start", "finish", key] + list(self.fields))
+
+    def write(self, interval: dict) -> None:
+        """
+        Writes a single interval, with its labels in sorted order.
+        :param interval: a dictionary containing the fields 'start', 'finish', 'key' and any other 'fields'.
+        """
+        items = sorted(interval[self.key], key=str)
+        if self.fmt == "csv":
+            self._csv.writerow([
+                _encode(interval["start"]), _encode(interval["finish"]), self.separator.join(map(str, items))
+            ] + [interval[field] for field in self.fields])
+        else:
+            row = {"start": interval["start"], "finish": interval["finish"], self.key: items}
+            for field in self.fields:
+                row[field] = interval[field]
+            self.stream.write(json.dumps(row, default=_encode) + "\n")
+        self.written += 1
+
+
+def _spill(run: list, directory: str) -> str:
+    """
+    Writes a sorted run of intervals to a temporary file.
+    :param run: a list of intervals sorted by their start time.
+    :param directory: the directory in which to create the file.
+    :return: the path of the file.
+    """
+    descriptor, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(descriptor, "wb") as f:
+        for interval in run:
+            pickle.dump(interval, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _replay(path: str) -> Iterator[dict]:
+    """
+    Reads back a sorted run of intervals written by _spill.
+    :param path: the path of the file.
+    :return: a generator of intervals sorted by their start time.
+    """
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def sort_intervals(intervals, chunk_size: int = 100000, directory: str = None) -> Iterator[dict]:
+    """
+    Sorts intervals by their start time using bounded memory. Intervals are sorted in chunks of at most 'chunk_size'
+    and, when there is more than one chunk, each sorted chunk is spilled to a temporary file before the runs are
+    merged back together.
+    :param intervals: an iterable of intervals.
+    :param chunk_size: the maximum number of intervals held in memory while sorting.
+    :param directory: the directory in which to spill sorted runs. Defaults to the system temporary directory.
+    :return: a generator of intervals sorted by their start time.
+    """
+
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be a positive integer.")
+
+    intervals = iter(intervals)
+    run = sorted(islice(intervals, chunk_size), key=itemgetter("start"))
+    if len(run) < chunk_size:
+        # everything fits into a single chunk, so there is nothing to spill
+        yield from run
+        return
+
+    with tempfile.TemporaryDirectory(dir=directory) as spill:
+        paths = list()
+        while run:
+            paths.append(_spill(run, spill))
+            run = sorted(islice(intervals, chunk_size), key=itemgetter("start"))
+        yield from merge(*(_replay(p) for p in paths), key=itemgetter("start"))
+
+
+def union_stream(intervals, write: Callable, key: str = "set_items", group: str = None, **options) -> int:
+    """
+    Merges a stream of intervals sorted by their start time, passing each merged interval on as soon as it is
+    finalized. Memory is bounded by the number of open intervals rather than by the length of the stream.
+    :param intervals: an iterable of dictionaries containing the fields 'start', 'finish' and 'key', sorted by
+    'start' (within each group, if grouped).
+    :param write: a function called with each merged interval, such as IntervalWriter.write.
+    :param key: the field containing the labels of each interval. Default value is 'set_items'.
+    :param group: a field whose value identifies independent groups of intervals, which are merged separately and
+    whose merged intervals carry the same field. Defaults to a single group.
+    :param options: other keyword arguments of the IncrementalMerge, such as 'bitset' or 'coalesce_equal'.
+    :return: the number of merged intervals passed on.
+    """
+
+    merges = dict()
+    written = 0
+    for interval in intervals:
+        name = None if group is None else interval[group]
+        incremental = merges.get(name)
+        if incremental is None:
+            incremental = merges[name] = IncrementalMerge(key=key, **options)
+        for merged in incremental.push(interval):
+            if group is not None:
+                merged[group] = name
+            write(merged)
+            written += 1
+
+    for name, incremental in merges.items():
+        for merged in incremental.flush():
+            if group is not None:
+                merged[group] = name
+            write(merged)
+            written += 1
+
+    return written
+
+
+def union_file(source: str, destination: str, key: str = "set_items", chunk_size: int = 100000,
+               directory: str = None, fmt: str = None, parse: Callable = None, separator: str = ";",
+               bitset: bool = False) -> int:
+    """
+    Merges the intervals of a file which may not fit into memory, writing the merged intervals to another file. The
+    input is sorted in chunks of 'chunk_size' intervals which are spilled to disk, and the sorted runs are streamed
+    through an IncrementalMerge. Merged intervals spanning the boundary between two chunks are therefore stitched
+    exactly as Merge.union would, and memory is bounded by the chunk size plus the number of open intervals.
+    :param source: the path of a JSON lines or CSV file of intervals.
+    :param destination: the path of the file to write the merged intervals to, in the same format as the source.
+    :param key: the field containing the labels of each interval. Default value is 'set_items'.
+    :param chunk_size: the maximum number of intervals held in memory while sorting, which acts as the memory budget.
+    :param directory: the directory in which to spill sorted runs. Defaults to the system temporary directory.
+    :param fmt: the format of the source, either 'jsonl' or 'csv'. Inferred from the file extension if not given.
+    :param parse: a function applied to each start and finish, e.g. datetime.datetime.fromisoformat.
+    :param separator: the string separating labels in CSV.
+    :param bitset: if True, labels are carried through the merge as bitmasks.
+    :return: the number of merged intervals written.
+    """
+
+    fmt = detect_format(source) if fmt is None else fmt
+
+    with open(source, newline="") as f_in, open(destination, "w", newline="") as f_out:
+        intervals = read_intervals(f_in, fmt=fmt, key=key, parse=parse, separator=separator)
+        writer = IntervalWriter(f_out, fmt=fmt, key=key, separator=separator)
+        union_stream(sort_intervals(intervals, chunk_size=chunk_size, directory=directory), writer.write, key=key,
+                     bitset=bitset)
+
+    return writer.written
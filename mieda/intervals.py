@@ -9,13 +9,1142 @@ information to foreign countries or providing access to foreign persons.
 ========================================================================================================
 """
 
-from itertools import combinations
-import networkx as nx
-from operator import itemgetter
-from typing import Tuple
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Sequence, Set
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from functools import reduce
+from heapq import heapify, heappop, heappush
+from itertools import chain, repeat
+import math
+from operator import attrgetter, itemgetter
+from time import perf_counter
+from typing import Callable, Iterator, Tuple
 import warnings
 
 
+class LabelSet(Set):
+    """
+    An immutable set of labels stored as a bitmask over a shared vocabulary. Produced by Merge.union(bitset=True),
+    where merging labels amounts to a bitwise OR and labels are only decoded when the set is iterated. Compares equal
+    to a regular set containing the same labels.
+    """
+
+    __slots__ = ("mask", "vocabulary", "index")
+
+    def __init__(self, mask: int, vocabulary: list, index: dict) -> None:
+        """
+        :param mask: an integer whose set bits identify the labels in the set.
+        :param vocabulary: a list mapping each bit position to its label.
+        :param index: a dictionary mapping each label to its bit position.
+        """
+        self.mask = mask
+        self.vocabulary = vocabulary
+        self.index = index
+
+    @classmethod
+    def _from_iterable(cls, it) -> set:
+        # results of set operations with other sets are regular sets
+        return set(it)
+
+    def __contains__(self, item) -> bool:
+        bit = self.index.get(item)
+        return bit is not None and bool(self.mask >> bit & 1)
+
+    def __iter__(self) -> Iterator:
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield self.vocabulary[low.bit_length() - 1]
+            mask ^= low
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __or__(self, other):
+        if isinstance(other, LabelSet) and other.vocabulary is self.vocabulary:
+            return LabelSet(self.mask | other.mask, self.vocabulary, self.index)
+        return Set.__or__(self, other)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LabelSet) and other.vocabulary is self.vocabulary:
+            return self.mask == other.mask
+        return Set.__eq__(self, other)
+
+    def __hash__(self) -> int:
+        return self._hash()
+
+    def __repr__(self) -> str:
+        return "LabelSet({!r})".format(set(self))
+
+
+class _SetLabels:
+    """
+    Reference counts the labels of the open intervals during a sweep, producing a set of the active labels.
+    """
+
+    __slots__ = ("counts",)
+
+    def __init__(self) -> None:
+        self.counts = dict()
+
+    def prepare(self, items) -> set:
+        return items
+
+    def add(self, items) -> None:
+        counts = self.counts
+        for item in items:
+            counts[item] = counts.get(item, 0) + 1
+
+    def remove(self, items) -> None:
+        counts = self.counts
+        for item in items:
+            counts[item] -= 1
+            if counts[item] == 0:
+                del counts[item]
+
+    def value(self) -> set:
+        return set(self.counts)
+
+
+class _BitsetLabels:
+    """
+    Reference counts the labels of the open intervals during a sweep as integer bits, producing a LabelSet of the
+    active labels. Labels are interned into the vocabulary the first time they are seen.
+    """
+
+    __slots__ = ("vocabulary", "index", "counts", "mask")
+
+    def __init__(self) -> None:
+        self.vocabulary = list()
+        self.index = dict()
+        self.counts = list()
+        self.mask = 0
+
+    def prepare(self, items) -> list:
+        bits = list()
+        for item in items:
+            bit = self.index.get(item)
+            if bit is None:
+                bit = self.index[item] = len(self.vocabulary)
+                self.vocabulary.append(item)
+                self.counts.append(0)
+            bits.append(bit)
+        return bits
+
+    def add(self, bits) -> None:
+        counts = self.counts
+        for bit in bits:
+            if counts[bit] == 0:
+                self.mask |= 1 << bit
+            counts[bit] += 1
+
+    def remove(self, bits) -> None:
+        counts = self.counts
+        for bit in bits:
+            counts[bit] -= 1
+            if counts[bit] == 0:
+                self.mask ^= 1 << bit
+
+    def value(self) -> LabelSet:
+        return LabelSet(self.mask, self.vocabulary, self.index)
+
+
+class Interval:
+    """
+    A lightweight interval record which Merge.union and IncrementalMerge accept and emit in place of a dictionary.
+    Fields can be read as attributes or, like a dictionary, by name: 'start', 'finish', and any other name (such as
+    the key passed to Merge.union) for the set of items.
+    """
+
+    __slots__ = ("start", "finish", "items")
+
+    def __init__(self, start, finish, items: set) -> None:
+        """
+        :param start: the start of the interval.
+        :param finish: the finish of the interval.
+        :param items: the set of items contained in the interval.
+        """
+        self.start = start
+        self.finish = finish
+        self.items = items
+
+    def __getitem__(self, field: str):
+        if field == "start":
+            return self.start
+        if field == "finish":
+            return self.finish
+        return self.items
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Interval):
+            return self.start == other.start and self.finish == other.finish and self.items == other.items
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "Interval(start={!r}, finish={!r}, items={!r})".format(self.start, self.finish, self.items)
+
+
+def _keys(key) -> list:
+    """
+    Lists the keys to merge on.
+    :param key: a string which identifies a single key, or a list (or tuple) of them.
+    :return: a list of keys.
+    """
+    return list(key) if isinstance(key, (list, tuple)) else [key]
+
+
+def _with_items(interval, key: str, items: set):
+    """
+    Copies an interval with its set replaced, leaving the original untouched.
+    :param interval: a dictionary or Interval.
+    :param key: the key containing the set of the interval.
+    :param items: the new set.
+    :return: a copy of the interval of the same type.
+    """
+    if isinstance(interval, Interval):
+        return Interval(interval.start, interval.finish, items)
+    copy = dict(interval)
+    copy[key] = items
+    return copy
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _is_timestamp(time) -> bool:
+    return isinstance(time, datetime.datetime) or type(time).__name__ == "datetime64"
+
+
+def _epoch_ns(times: list) -> list:
+    """
+    Converts timestamps to integer nanoseconds since the epoch. Aware timestamps are converted from their timezone, and
+    naive timestamps are taken as they are. Timestamps of the same type as the first are converted in bulk, and a list
+    mixing types falls back to converting each timestamp on its own.
+    :param times: a list of datetime.datetime, pandas.Timestamp or numpy.datetime64.
+    :return: a list of the number of nanoseconds since 1970-01-01 of each timestamp.
+    """
+    sample = times[0]
+    try:
+        if isinstance(sample, datetime.datetime):
+            if isinstance(getattr(sample, "value", None), int):
+                # a pandas Timestamp already holds its nanoseconds since the (UTC) epoch
+                return list(map(attrgetter("value"), times))
+            epoch = _EPOCH if sample.tzinfo is None else _EPOCH_UTC
+            return [(t - epoch) // _MICROSECOND * 1000 for t in times]
+
+        import numpy as np
+        return np.array(times, dtype="datetime64[ns]").view("int64").tolist()
+    except (AttributeError, TypeError, ValueError):
+        return [_time_ns(t) for t in times]
+
+
+def _time_ns(time) -> int:
+    """
+    Converts a single timestamp to integer nanoseconds since the epoch (see _epoch_ns).
+    :param time: a datetime.datetime, pandas.Timestamp or numpy.datetime64.
+    :return: the number of nanoseconds since 1970-01-01.
+    """
+    value = getattr(time, "value", None)
+    if isinstance(value, int):
+        return value
+    if isinstance(time, datetime.datetime):
+        return (time - (_EPOCH if time.tzinfo is None else _EPOCH_UTC)) // _MICROSECOND * 1000
+    return int(time.astype("datetime64[ns]").astype("int64"))
+
+
+def _duration_ns(duration):
+    """
+    Converts a duration to integer nanoseconds, leaving anything which is not a timedelta as it is.
+    :param duration: a datetime.timedelta, pandas.Timedelta or numpy.timedelta64, or None.
+    :return: the number of nanoseconds in the duration.
+    """
+    if isinstance(duration, datetime.timedelta):
+        value = getattr(duration, "value", None)
+        return value if isinstance(value, int) else duration // _MICROSECOND * 1000
+    if type(duration).__name__ == "timedelta64":
+        return int(duration.astype("timedelta64[ns]").astype("int64"))
+    return duration
+
+
+def _to_epoch(intervals: list, key: str) -> Tuple[list, dict]:
+    """
+    Copies intervals with their timestamps replaced by integer nanoseconds since the epoch, which compare, sort and
+    hash faster.
+    :param intervals: a list of dictionaries or Interval records whose start and finish are timestamps.
+    :param key: the key containing the set of each interval.
+    :return: the converted intervals, and a dictionary mapping each integer back to a timestamp it came from.
+    """
+    starts = [i["start"] for i in intervals]
+    finishes = [i["finish"] for i in intervals]
+    # as integers, naive and aware timestamps would compare silently, so they are rejected as they are without them
+    if len({getattr(t, "tzinfo", None) is None for t in chain(starts, finishes)}) > 1:
+        raise TypeError("can't compare offset-naive and offset-aware datetimes")
+    start_ns, finish_ns = _epoch_ns(starts), _epoch_ns(finishes)
+    decoded = dict(zip(start_ns, starts))
+    decoded.update(zip(finish_ns, finishes))
+
+    converted = list()
+    for i, start, finish in zip(intervals, start_ns, finish_ns):
+        if isinstance(i, Interval):
+            converted.append(Interval(start, finish, i.items))
+        else:
+            copy = dict(i)
+            copy["start"] = start
+            copy["finish"] = finish
+            converted.append(copy)
+    return converted, decoded
+
+
+def _from_epoch(merged: list, decoded: dict) -> None:
+    """
+    Restores the timestamps of merged intervals whose boundaries were converted by _to_epoch, in place.
+    :param merged: a list of merged dictionaries or Interval records.
+    :param decoded: the dictionary returned by _to_epoch.
+    """
+    for m in merged:
+        if isinstance(m, Interval):
+            m.start, m.finish = decoded[m.start], decoded[m.finish]
+        else:
+            m["start"], m["finish"] = decoded[m["start"]], decoded[m["finish"]]
+
+
+class _CountLabels(_SetLabels):
+    """
+    Reference counts the labels of the open intervals during a sweep, producing only the number of active labels.
+    """
+
+    __slots__ = ()
+
+    def value(self) -> int:
+        return len(self.counts)
+
+
+class _ExtremeValue:
+    """
+    Tracks the values of the open intervals during a sweep, producing the smallest (or largest) of them. Values are
+    reference counted, and removed values are discarded lazily from the top of a heap.
+    """
+
+    __slots__ = ("counts", "heap", "sign")
+
+    def __init__(self, largest: bool = False) -> None:
+        self.counts = dict()
+        self.heap = list()
+        self.sign = -1 if largest else 1
+
+    def prepare(self, value):
+        return value
+
+    def add(self, value) -> None:
+        if value in self.counts:
+            self.counts[value] += 1
+        else:
+            self.counts[value] = 1
+            heappush(self.heap, self.sign * value)
+
+    def remove(self, value) -> None:
+        self.counts[value] -= 1
+        if self.counts[value] == 0:
+            del self.counts[value]
+
+    def value(self):
+        while self.sign * self.heap[0] not in self.counts:
+            heappop(self.heap)
+        return self.sign * self.heap[0]
+
+
+class _CombineValues:
+    """
+    Tracks the values of the open intervals during a sweep, producing the result of folding them together with an
+    associative function in the order in which the intervals were opened.
+    """
+
+    __slots__ = ("combine", "values", "order")
+
+    def __init__(self, combine: Callable) -> None:
+        self.combine = combine
+        self.values = dict()
+        self.order = 0
+
+    def prepare(self, value) -> tuple:
+        # each interval is identified by a token, since values need not be hashable or unique
+        self.order += 1
+        return self.order, value
+
+    def add(self, token) -> None:
+        self.values[token[0]] = token[1]
+
+    def remove(self, token) -> None:
+        del self.values[token[0]]
+
+    def value(self):
+        return reduce(self.combine, self.values.values())
+
+
+def _accumulator(bitset: bool = False, aggregate=None):
+    """
+    Creates the accumulator which tracks the open intervals of a sweep.
+    :param bitset: if True, labels are carried through the merge as bitmasks.
+    :param aggregate: None to produce the set of active labels, 'count' to produce the number of active labels, 'min'
+    or 'max' to produce the smallest or largest value of the active intervals, or an associative function of two
+    arguments used to fold the values of the active intervals together.
+    :return: the accumulator.
+    """
+    if aggregate is None:
+        return _BitsetLabels() if bitset else _SetLabels()
+    if bitset:
+        raise ValueError("Bitset label sets cannot be combined with an aggregate.")
+    if aggregate == "count":
+        return _CountLabels()
+    if aggregate in ("min", "max"):
+        return _ExtremeValue(largest=aggregate == "max")
+    if callable(aggregate):
+        return _CombineValues(aggregate)
+    raise ValueError("Unknown aggregate '{}' - expected one of 'count', 'min', 'max' or a function.".format(aggregate))
+
+
+class _KeyedLabels:
+    """
+    Tracks the labels of several keys of the open intervals during a sweep at once, with one accumulator per key,
+    producing a tuple of the active labels of each key.
+    """
+
+    __slots__ = ("accumulators",)
+
+    def __init__(self, accumulators: list) -> None:
+        self.accumulators = accumulators
+
+    def prepare(self, items: tuple) -> tuple:
+        return tuple(a.prepare(i) for a, i in zip(self.accumulators, items))
+
+    def add(self, items: tuple) -> None:
+        for a, i in zip(self.accumulators, items):
+            a.add(i)
+
+    def remove(self, items: tuple) -> None:
+        for a, i in zip(self.accumulators, items):
+            a.remove(i)
+
+    def value(self) -> tuple:
+        return tuple(a.value() for a in self.accumulators)
+
+
+class _Coalescer:
+    """
+    Shrinks a stream of merged intervals as they are emitted by holding back the latest one: adjacent intervals with
+    equal sets are coalesced, gaps of at most 'max_gap' are bridged by extending the earlier interval, and intervals
+    shorter than 'min_duration' are dropped once they can no longer grow.
+    """
+
+    __slots__ = ("coalesce_equal", "max_gap", "min_duration", "make", "pending")
+
+    def __init__(self, make: Callable, coalesce_equal: bool = False, max_gap=None, min_duration=None) -> None:
+        """
+        :param make: a function of (start, finish, value) which creates a merged interval.
+        :param coalesce_equal: if True, adjacent intervals with equal sets are coalesced into one.
+        :param max_gap: the largest gap between two intervals which is bridged, or None.
+        :param min_duration: the shortest duration of an interval which is kept, or None.
+        """
+        self.coalesce_equal = coalesce_equal
+        self.max_gap = max_gap
+        self.min_duration = min_duration
+        self.make = make
+        self.pending = None
+
+    def add(self, start, finish, value, finalized: list) -> None:
+        """
+        Adds the next merged interval, releasing the one held back if the two cannot be joined.
+        :param start: the start of the merged interval.
+        :param finish: the finish of the merged interval.
+        :param value: the set (or aggregate) of the merged interval.
+        :param finalized: a list to which released merged intervals are appended.
+        """
+        pending = self.pending
+        if pending is not None:
+            touching = pending[1] == start
+            if touching or (self.max_gap is not None and start - pending[1] <= self.max_gap):
+                if self.coalesce_equal and pending[2] == value:
+                    pending[1] = finish
+                    return
+                pending[1] = start
+            self.release(finalized)
+        self.pending = [start, finish, value]
+
+    def release_before(self, time, finalized: list) -> None:
+        """
+        Releases the merged interval held back if no merged interval starting at 'time' or later can join it.
+        :param time: the earliest start of any merged interval still to come.
+        :param finalized: a list to which the released merged interval is appended.
+        """
+        pending = self.pending
+        if pending is not None and pending[1] < time and (self.max_gap is None or time - pending[1] > self.max_gap):
+            self.release(finalized)
+
+    def release(self, finalized: list) -> None:
+        """
+        Releases the merged interval held back, unless it is too short to keep.
+        :param finalized: a list to which the released merged interval is appended.
+        """
+        start, finish, value = self.pending
+        self.pending = None
+        if self.min_duration is None or finish - start >= self.min_duration:
+            finalized.append(self.make(start, finish, value))
+
+
+class IncrementalMerge:
+    """
+    Merges intervals as they arrive, emitting each merged interval as soon as it can no longer change. Intervals must
+    be pushed in non-decreasing order of their start time; the start of the latest interval acts as a watermark, and
+    any segment finishing at or before the watermark is final. Memory is bounded by the number of open intervals
+    rather than the number of intervals pushed. Feeding every interval and then calling flush() produces the same
+    output as Merge.union.
+    """
+
+    def __init__(self, key: str = "set_items", bitset: bool = False, records: bool = False, aggregate=None,
+                 field: str = None, coalesce_equal: bool = False, max_gap=None, min_duration=None) -> None:
+        """
+        :param key: a string which identifies the key to use when merging intervals based on the sets contained in the
+        intervals, or a list of them to merge on several keys at once. Default value is 'set_items'.
+        :param bitset: if True, labels are carried through the merge as bitmasks and merged intervals hold a LabelSet.
+        :param records: if True, merged intervals are emitted as Interval records rather than dictionaries.
+        :param aggregate: if given, merged intervals hold a reduced value under 'key' instead of the set of active
+        labels: 'count' for the number of active labels, 'min' or 'max' for the smallest or largest 'field' of the
+        active intervals, or an associative function of two arguments which folds together the 'field' (or, without
+        a field, the set) of the active intervals.
+        :param field: a string which identifies the key containing the value of each interval to aggregate.
+        :param coalesce_equal: if True, adjacent merged intervals with equal sets (or aggregates) are coalesced into
+        one as they are emitted.
+        :param max_gap: if given, gaps of at most this duration between merged intervals are bridged by extending the
+        earlier interval up to the start of the later one.
+        :param min_duration: if given, merged intervals shorter than this duration are dropped, after any coalescing.
+        """
+        if aggregate in ("min", "max") and field is None:
+            raise ValueError("The '{}' aggregate requires a field.".format(aggregate))
+        self.key = key
+        self.records = records
+        self.field = field
+        self._keys = _keys(key) if isinstance(key, (list, tuple)) else None
+        if self._keys is None:
+            self._labels = _accumulator(bitset, aggregate)
+        elif records:
+            raise ValueError("Interval records hold a single set, so they cannot be merged on several keys.")
+        elif aggregate is not None:
+            raise ValueError("Aggregates are only supported when merging on a single key.")
+        else:
+            self._labels = _KeyedLabels([_accumulator(bitset) for _ in self._keys])
+        self._post = None
+        if coalesce_equal or max_gap is not None or min_duration is not None:
+            self._post = _Coalescer(self._make, coalesce_equal, max_gap, min_duration)
+        self._open = list()
+        self._cursor = None
+        self._order = 0
+        self.peak_open_intervals = 0
+
+    @property
+    def watermark(self):
+        """
+        The time up to which merged intervals have been emitted, or None if nothing has been pushed yet.
+        """
+        return self._cursor
+
+    @property
+    def open_intervals(self) -> int:
+        """
+        The number of intervals which are currently open.
+        """
+        return len(self._open)
+
+    def push(self, interval: dict) -> list:
+        """
+        Adds an interval to the merge.
+        :param interval: a dictionary or Interval containing the fields 'start', 'finish' and 'key'. Its start must not
+        come before the start of any previously pushed interval. The interval is never modified.
+        :return: a list of the merged intervals finalized by the start of the pushed interval, sorted by their start
+        time.
+        """
+
+        start = interval["start"]
+        if self._cursor is not None and start < self._cursor:
+            raise ValueError("Intervals must be pushed in non-decreasing order of their start time.")
+
+        if self._keys is None:
+            status, interval_set = Merge.check_input_interval_set_type(interval[self.key])
+        else:
+            checked = [Merge.check_input_interval_set_type(interval[k]) for k in self._keys]
+            status = all(c[0] for c in checked)
+            interval_set = tuple(c[1] for c in checked)
+        if status is False:
+            warnings.warn("The correct input format is a set - converted lists to sets.")
+
+        finalized = list()
+        self._close_until(start, finalized)
+
+        # the open intervals share every label between the last boundary and this start
+        if self._open and self._cursor < start:
+            self._emit(self._cursor, start, finalized)
+        self._cursor = start
+
+        # the next merged interval starts here, so an interval held back which cannot reach it is final
+        if self._post is not None:
+            self._post.release_before(start, finalized)
+
+        # the order breaks ties between equal finishes, so that the labels themselves are never compared
+        if self.field is None:
+            items = self._labels.prepare(interval_set)
+        elif isinstance(interval, Interval):
+            raise ValueError("Interval records hold no fields other than their set, so they cannot be aggregated by "
+                             "field.")
+        else:
+            items = self._labels.prepare(interval[self.field])
+        heappush(self._open, (interval["finish"], self._order, items))
+        self._order += 1
+        if len(self._open) > self.peak_open_intervals:
+            self.peak_open_intervals = len(self._open)
+        self._labels.add(items)
+
+        return finalized
+
+    def extend(self, intervals) -> Iterator[dict]:
+        """
+        Adds intervals to the merge, consuming them lazily.
+        :param intervals: an iterable of intervals in non-decreasing order of their start time.
+        :return: a generator of merged intervals, yielded as soon as each one is finalized.
+        """
+        for interval in intervals:
+            yield from self.push(interval)
+
+    def flush(self) -> list:
+        """
+        Closes every open interval. Further intervals may still be pushed, provided they do not start before the
+        new watermark.
+        :return: a list of the remaining merged intervals, sorted by their start time.
+        """
+        finalized = list()
+        if self._open:
+            self._close_until(max(o[0] for o in self._open), finalized)
+        if self._post is not None and self._post.pending is not None:
+            self._post.release(finalized)
+        return finalized
+
+    def _make(self, start, finish, value):
+        """
+        Creates a merged interval.
+        :param start: the start of the merged interval.
+        :param finish: the finish of the merged interval.
+        :param value: the set (or aggregate) of the merged interval, or a tuple of the set of each key.
+        :return: a dictionary, or an Interval if records are requested.
+        """
+        if self.records:
+            return Interval(start, finish, value)
+        if self._keys is not None:
+            merged = {"start": start, "finish": finish}
+            merged.update(zip(self._keys, value))
+            return merged
+        return {"start": start, "finish": finish, self.key: value}
+
+    def _emit(self, start, finish, finalized: list) -> None:
+        """
+        Emits a merged interval holding the labels which are currently active.
+        :param start: the start of the merged interval.
+        :param finish: the finish of the merged interval.
+        :param finalized: a list to which the merged interval is appended.
+        """
+        if self._post is None:
+            finalized.append(self._make(start, finish, self._labels.value()))
+        else:
+            self._post.add(start, finish, self._labels.value(), finalized)
+
+    def _close_until(self, time, finalized: list) -> None:
+        """
+        Emits a merged interval for every finish reached at or before 'time' and retires the intervals finishing there.
+        :param time: the time up to which open intervals are closed.
+        :param finalized: a list to which the merged intervals are appended.
+        """
+        while self._open and self._open[0][0] <= time:
+            finish = self._open[0][0]
+            if self._cursor < finish:
+                self._emit(self._cursor, finish, finalized)
+                self._cursor = finish
+            while self._open and self._open[0][0] == finish:
+                self._labels.remove(heappop(self._open)[2])
+
+
+class MergedTimeline(list):
+    """
+    The output of Merge.union: a list of merged intervals sorted by their start time, which iterates and compares
+    like a plain list. Since merged intervals never overlap, both their starts and their finishes are sorted, and
+    an index of each is built once so that point and range queries are answered by binary search in O(log n + k).
+    The index reflects the intervals the timeline was created with and is not updated if the list is modified.
+    """
+
+    def __init__(self, intervals=(), key: str = "set_items") -> None:
+        """
+        :param intervals: an iterable of merged intervals, sorted by their start time and not overlapping.
+        :param key: the key containing the set of each interval, or a list of them. Default value is 'set_items'.
+        """
+        super().__init__(intervals)
+        self.key = key
+        self.starts = [i["start"] for i in self]
+        self.finishes = [i["finish"] for i in self]
+
+    def segment_at(self, time):
+        """
+        Finds the merged interval covering a point in time.
+        :param time: the point in time to look up.
+        :return: the merged interval whose start is at or before 'time' and whose finish is after it, or None.
+        """
+        n = bisect_right(self.starts, time) - 1
+        if n >= 0 and time < self.finishes[n]:
+            return self[n]
+        return None
+
+    def at(self, time) -> set:
+        """
+        Finds the labels which are active at a point in time.
+        :param time: the point in time to look up.
+        :return: the set of labels active at 'time', which is empty if no interval covers it. For a timeline merged on
+        several keys, a dictionary mapping each key to its set.
+        """
+        segment = self.segment_at(time)
+        if isinstance(self.key, (list, tuple)):
+            return {k: set() if segment is None else segment[k] for k in self.key}
+        return set() if segment is None else segment[self.key]
+
+    def overlapping(self, start, finish) -> list:
+        """
+        Finds the merged intervals which overlap a range of time.
+        :param start: the start of the range (inclusive).
+        :param finish: the finish of the range (exclusive).
+        :return: a list of the merged intervals which overlap [start, finish), sorted by their start time.
+        """
+        return self[bisect_right(self.finishes, start):bisect_left(self.starts, finish)]
+
+    def labels_between(self, start, finish) -> set:
+        """
+        Finds every label which is active at some point within a range of time.
+        :param start: the start of the range (inclusive).
+        :param finish: the finish of the range (exclusive).
+        :return: the union of the labels of the merged intervals which overlap [start, finish). For a timeline merged on
+        several keys, a dictionary mapping each key to its union.
+        """
+        overlapping = self.overlapping(start, finish)
+        if isinstance(self.key, (list, tuple)):
+            return {k: set().union(*(i[k] for i in overlapping)) for k in self.key}
+        return set().union(*(i[self.key] for i in overlapping))
+
+    def to_networkx(self):
+        """
+        Builds a directed graph of the merged intervals, in which each start and finish is a node and each merged
+        interval is an edge from its start to its finish carrying its set under 'key' (or the set of each key).
+        Requires NetworkX.
+        :return: a networkx.DiGraph of the merged intervals.
+        """
+
+        import networkx as nx
+
+        keys = _keys(self.key)
+        graph = nx.DiGraph()
+        for i in self:
+            graph.add_edge(i["start"], i["finish"], **{k: i[k] for k in keys})
+
+        return graph
+
+
+class TimelinePyramid:
+    """
+    Precomputed summaries of a merged timeline at power-of-two resolutions, for drawing long timelines quickly. Level 0
+    divides time into buckets of width 'base' starting at the first merged interval, and each level above halves the
+    number of buckets until a single bucket covers everything. Each bucket records the fraction of it which each label
+    covers, and only buckets covering some label are stored. A query picks the coarsest level which still resolves a
+    range into at least as many buckets as requested, so drawing cost depends on the width of the view rather than on
+    the number of merged intervals.
+    """
+
+    def __init__(self, timeline: list, key: str = None, base=None) -> None:
+        """
+        :param timeline: a list of merged intervals sorted by their start time, such as a MergedTimeline.
+        :param key: the key containing the set of each merged interval. Defaults to the key of a MergedTimeline, or
+        'set_items'.
+        :param base: the width of the buckets of level 0, in the units of the timeline (e.g. a datetime.timedelta).
+        Defaults to the span of the timeline divided by the smallest power of two at least as large as the number of
+        merged intervals.
+        """
+        key = getattr(timeline, "key", "set_items") if key is None else key
+        if isinstance(key, (list, tuple)):
+            raise ValueError("A pyramid summarizes a single key - choose one of {}.".format(", ".join(key)))
+        self.key = key
+        self.timeline = timeline if isinstance(timeline, MergedTimeline) else MergedTimeline(timeline, key=key)
+        self.origin = timeline[0]["start"] if timeline else None
+        self.levels = list()
+        if not timeline:
+            self.base = base
+            return
+
+        span = timeline[-1]["finish"] - self.origin
+        if base is None:
+            base = span / (1 << max(len(timeline) - 1, 0).bit_length())
+        self.base = base
+
+        # level 0: spread the coverage of each merged interval over the buckets it overlaps
+        buckets = dict()
+        for i in timeline:
+            first, last = self._position(i["start"]), self._position(i["finish"])
+            if not i[key]:
+                continue
+            for b in range(int(first), math.ceil(last)):
+                covered = min(last, b + 1) - max(first, b)
+                if covered > 0:
+                    coverage = buckets.setdefault(b, dict())
+                    for label in i[key]:
+                        coverage[label] = coverage.get(label, 0.0) + covered
+        self.levels.append(self._freeze(buckets))
+
+        # each coarser level folds pairs of buckets of the level below
+        while len(self.levels[-1][0]) > 1 or (self.levels[-1][0] and self.levels[-1][0][0] > 0):
+            below = self.levels[-1]
+            buckets = dict()
+            for b, coverage in zip(*below):
+                total = buckets.setdefault(b >> 1, dict())
+                for label, covered in coverage.items():
+                    total[label] = total.get(label, 0.0) + covered
+            self.levels.append(self._freeze(buckets))
+
+    def _position(self, time) -> float:
+        # the position of a point in time in units of level 0 buckets
+        return (time - self.origin) / self.base
+
+    @staticmethod
+    def _freeze(buckets: dict) -> tuple:
+        indices = sorted(buckets)
+        return indices, [buckets[b] for b in indices]
+
+    def level_for(self, start, finish, width: int) -> int:
+        """
+        Chooses the level at which a range of time is resolved into at least 'width' buckets.
+        :param start: the start of the range (inclusive).
+        :param finish: the finish of the range (exclusive).
+        :param width: the number of buckets wanted across the range, e.g. the width of the view in pixels.
+        :return: the level, or -1 if even level 0 is coarser than asked for and the merged intervals themselves
+        should be drawn.
+        """
+        buckets = (finish - start) / self.base
+        if buckets < width:
+            return -1
+        return min(int(buckets / width).bit_length() - 1, len(self.levels) - 1)
+
+    def query(self, start, finish, width: int) -> list:
+        """
+        Summarizes the labels within a range of time at a resolution suited to drawing it 'width' buckets wide.
+        :param start: the start of the range (inclusive).
+        :param finish: the finish of the range (exclusive).
+        :param width: the number of buckets wanted across the range, e.g. the width of the view in pixels.
+        :return: a list of dictionaries containing the fields 'start', 'finish' and 'key', sorted by start time, where
+        'key' maps each label to the fraction of the bucket it covers. Buckets which no label covers are left out.
+        When the range is narrow enough, the merged intervals themselves are returned, with every label covering 1.
+        """
+        if not self.levels:
+            return list()
+
+        level = self.level_for(start, finish, width)
+        if level < 0:
+            return [
+                {"start": i["start"], "finish": i["finish"], self.key: dict.fromkeys(i[self.key], 1.0)}
+                for i in self.timeline.overlapping(start, finish)
+            ]
+
+        indices, coverage = self.levels[level]
+        scale = 1 << level
+        first = bisect_right(indices, int(self._position(start) // scale) - 1)
+        last = bisect_left(indices, -int(-self._position(finish) // scale))
+        return [
+            {"start": self.origin + self.base * (b * scale), "finish": self.origin + self.base * ((b + 1) * scale),
+             self.key: {label: covered / scale for label, covered in c.items()}}
+            for b, c in zip(indices[first:last], coverage[first:last])
+        ]
+
+
+class DynamicTimeline(Sequence):
+    """
+    A merged timeline which can be edited in place. Each merged interval keeps a reference count for each of its
+    labels and a count of the intervals covering it, and each boundary a count of the intervals starting or finishing
+    there, so that inserting or removing an interval only splits or joins the merged intervals within its range, in
+    O(log n + k) plus the cost of a single list splice, and always leaves the same merged intervals as Merge.union over
+    the current intervals would.
+    """
+
+    def __init__(self, intervals=(), key: str = "set_items") -> None:
+        """
+        :param intervals: an iterable of dictionaries (or Interval records) containing the fields 'start', 'finish'
+        and 'key'.
+        :param key: the key containing the set of each interval. Default value is 'set_items'.
+        """
+        self.key = key
+        self.starts = list()
+        self.finishes = list()
+        self.counts = list()
+        self.depths = list()
+        self.edges = dict()
+        # the number of times each interval was inserted, so that only inserted intervals can be removed
+        self.intervals = dict()
+
+        # seed the merged intervals with a single sweep rather than one insert at a time
+        events = list()
+        for i in intervals:
+            start, finish, items = self._unpack(i)
+            if start <= finish:
+                self._count(start, finish, items, 1)
+                events.append((start, 1, items))
+                events.append((finish, -1, items))
+                self.edges[start] = self.edges.get(start, 0) + 1
+                self.edges[finish] = self.edges.get(finish, 0) + 1
+        events.sort(key=itemgetter(0, 1))
+        self.points = sorted(self.edges)
+
+        counts = dict()
+        depth = 0
+        for n, (time, change, items) in enumerate(events):
+            depth += change
+            for item in items:
+                counts[item] = counts.get(item, 0) + change
+                if counts[item] == 0:
+                    del counts[item]
+            if depth and n + 1 < len(events) and events[n + 1][0] > time:
+                self.starts.append(time)
+                self.finishes.append(events[n + 1][0])
+                self.counts.append(dict(counts))
+                self.depths.append(depth)
+
+    @classmethod
+    def from_timeline(cls, timeline: list, key: str = None) -> "DynamicTimeline":
+        """
+        Seeds a DynamicTimeline from the output of Merge.union. The intervals which were merged are not known, so each
+        merged interval is counted as a single interval: removals are exact for intervals inserted afterwards, and
+        for the merged intervals themselves.
+        :param timeline: a list of merged intervals, such as a MergedTimeline.
+        :param key: the key containing the set of each merged interval. Defaults to the key of a MergedTimeline, or
+        'set_items'.
+        :return: a DynamicTimeline containing the merged intervals.
+        """
+        return cls(timeline, key=getattr(timeline, "key", "set_items") if key is None else key)
+
+    def _unpack(self, interval) -> tuple:
+        items = interval[self.key]
+        return interval["start"], interval["finish"], set(items) if isinstance(items, list) else items
+
+    def _count(self, start, finish, items, change: int) -> None:
+        interval = (start, finish, frozenset(items))
+        self.intervals[interval] = self.intervals.get(interval, 0) + change
+        if self.intervals[interval] == 0:
+            del self.intervals[interval]
+
+    def _split(self, time) -> None:
+        # cuts the merged interval covering 'time' in two, both of which hold the same labels
+        n = bisect_right(self.starts, time) - 1
+        if n >= 0 and time < self.finishes[n] and self.starts[n] < time:
+            self.starts.insert(n + 1, time)
+            self.finishes.insert(n + 1, self.finishes[n])
+            self.counts.insert(n + 1, dict(self.counts[n]))
+            self.depths.insert(n + 1, self.depths[n])
+            self.finishes[n] = time
+
+    def _join(self, time) -> None:
+        # no interval starts or finishes at 'time' any longer, so the merged intervals on either side hold the same
+        # labels and become one
+        del self.edges[time]
+        del self.points[bisect_left(self.points, time)]
+        n = bisect_left(self.starts, time)
+        if 0 < n < len(self.starts) and self.starts[n] == time and self.finishes[n - 1] == time:
+            self.finishes[n - 1] = self.finishes[n]
+            del self.starts[n], self.finishes[n], self.counts[n], self.depths[n]
+
+    def _fill(self, start, finish, starts: list, finishes: list, counts: list, depths: list) -> None:
+        # covers a gap between merged intervals, split wherever an interval without duration lies within it
+        if start < finish:
+            inner = self.points[bisect_right(self.points, start):bisect_left(self.points, finish)]
+            starts.extend([start] + inner)
+            finishes.extend(inner + [finish])
+            counts.extend(dict() for _ in range(len(inner) + 1))
+            depths.extend([0] * (len(inner) + 1))
+
+    def insert(self, interval) -> None:
+        """
+        Adds an interval, splitting the merged intervals it overlaps and filling any gaps within its range.
+        :param interval: a dictionary (or Interval record) containing the fields 'start', 'finish' and 'key'.
+        """
+        start, finish, items = self._unpack(interval)
+        if start > finish:
+            return
+        self._count(start, finish, items, 1)
+        for time in (start, finish):
+            if time not in self.edges:
+                self.edges[time] = 0
+                insort(self.points, time)
+            self.edges[time] += 1
+        # an interval without duration holds no labels but still splits the merged interval it falls into
+        self._split(start)
+        if start == finish:
+            return
+        self._split(finish)
+
+        first = n = bisect_left(self.starts, start)
+        starts, finishes, counts, depths = list(), list(), list(), list()
+        cursor = start
+        while n < len(self.starts) and self.starts[n] < finish:
+            self._fill(cursor, self.starts[n], starts, finishes, counts, depths)
+            starts.append(self.starts[n])
+            finishes.append(self.finishes[n])
+            counts.append(self.counts[n])
+            depths.append(self.depths[n])
+            cursor = self.finishes[n]
+            n += 1
+        self._fill(cursor, finish, starts, finishes, counts, depths)
+
+        for c in counts:
+            for item in items:
+                c[item] = c.get(item, 0) + 1
+        self.starts[first:n] = starts
+        self.finishes[first:n] = finishes
+        self.counts[first:n] = counts
+        self.depths[first:n] = [d + 1 for d in depths]
+
+    def remove(self, interval) -> None:
+        """
+        Retracts an interval which was previously inserted, decrementing the reference count of its labels over its
+        range. Labels are dropped once no interval holds them, and merged intervals once no interval covers them.
+        Raises a ValueError if no interval with the same start, finish and labels was inserted.
+        :param interval: a dictionary (or Interval record) containing the fields 'start', 'finish' and 'key'.
+        """
+        start, finish, items = self._unpack(interval)
+        if start > finish:
+            return
+        if not self.intervals.get((start, finish, frozenset(items))):
+            raise ValueError("The interval from {} to {} is not in the timeline.".format(start, finish))
+        self._count(start, finish, items, -1)
+        if start == finish:
+            self.edges[start] -= 2
+            if self.edges[start] == 0:
+                self._join(start)
+            return
+
+        # the timeline is split at both ends of an inserted interval, and every merged interval within holds its labels
+        first = bisect_left(self.starts, start)
+        n = bisect_left(self.starts, finish, first)
+        for m in range(first, n):
+            self._decrement(self.counts[m], items)
+            self.depths[m] -= 1
+        kept = [m for m in range(first, n) if self.depths[m]]
+        self.starts[first:n] = [self.starts[m] for m in kept]
+        self.finishes[first:n] = [self.finishes[m] for m in kept]
+        self.counts[first:n] = [self.counts[m] for m in kept]
+        self.depths[first:n] = [self.depths[m] for m in kept]
+
+        for time in (start, finish):
+            self.edges[time] -= 1
+            if self.edges[time] == 0:
+                self._join(time)
+
+    @staticmethod
+    def _decrement(counts: dict, items) -> None:
+        for item in items:
+            counts[item] -= 1
+            if counts[item] == 0:
+                del counts[item]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self[i] for i in range(*n.indices(len(self)))]
+        return {"start": self.starts[n], "finish": self.finishes[n], self.key: set(self.counts[n])}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, DynamicTimeline)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def at(self, time) -> set:
+        """
+        Finds the labels which are active at a point in time.
+        :param time: the point in time to look up.
+        :return: the set of labels active at 'time', which is empty if no interval covers it.
+        """
+        n = bisect_right(self.starts, time) - 1
+        if n >= 0 and time < self.finishes[n]:
+            return set(self.counts[n])
+        return set()
+
+    def to_timeline(self) -> MergedTimeline:
+        """
+        Copies the current merged intervals.
+        :return: a MergedTimeline containing the merged intervals.
+        """
+        return MergedTimeline(self, key=self.key)
+
+
+class MergeStats:
+    """
+    Collects the time spent in each phase of a call to Merge.union, along with counters describing its input and
+    output, when passed as its 'stats' argument. The phases are 'convert' (converting lists to sets), 'duplicates'
+    (folding identical spans), 'sort' (sweep engine only), 'merge' and 'export' (building the MergedTimeline).
+    """
+
+    def __init__(self) -> None:
+        self.engine = None
+        self.phases = dict()
+        self.intervals_in = 0
+        self.converted = 0
+        self.duplicates = 0
+        self.shards = 1
+        self.splits = dict()
+        self.peak_open_intervals = None
+        self.segments_out = 0
+
+    def lap(self, phase: str, since: float) -> float:
+        """
+        Records the time elapsed in a phase.
+        :param phase: the name of the phase.
+        :param since: the value of time.perf_counter() when the phase began.
+        :return: the value of time.perf_counter() when the phase ended.
+        """
+        now = perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - since
+        return now
+
+    def split(self, branch: str) -> None:
+        """
+        Counts an edge split made by a branch of the 'graph' engine.
+        :param branch: the name of the branch.
+        """
+        self.splits[branch] = self.splits.get(branch, 0) + 1
+
+    def as_dict(self) -> dict:
+        """
+        :return: a dictionary of every timing and counter, suitable for a metrics system.
+        """
+        return {
+            "engine": self.engine,
+            "phases": dict(self.phases),
+            "intervals_in": self.intervals_in,
+            "converted": self.converted,
+            "duplicates": self.duplicates,
+            "shards": self.shards,
+            "splits": dict(self.splits),
+            "peak_open_intervals": self.peak_open_intervals,
+            "segments_out": self.segments_out
+        }
+
+    def __repr__(self) -> str:
+        return "MergeStats({!r})".format(self.as_dict())
+
+
 class Merge:
 
     @staticmethod
@@ -32,45 +1161,642 @@ class Merge:
         return passed, interval_set
 
     @staticmethod
-    def union(intervals: list, key: str = "set_items") -> list:
+    def _check_sets(intervals: list, key) -> Tuple[list, int]:
+        """
+        Checks the format of the sets of each interval, converting copies of the intervals holding lists so that the
+        caller's intervals are never modified.
+        :param intervals: a list of dictionaries or Interval records.
+        :param key: a string which identifies the key containing the set of each interval, or a list of them.
+        :return: a list of intervals holding sets, and the number of intervals which were converted.
+        """
+        keys = _keys(key)
+        if len(keys) > 1 and intervals and isinstance(intervals[0], Interval):
+            raise ValueError("Interval records hold a single set, so they cannot be merged on several keys.")
+
+        converted = 0
+        checked = list()
+        for i in intervals:
+            copied = False
+            for k in keys:
+                status, interval_set = Merge.check_input_interval_set_type(i[k])
+                if status is False:
+                    copied = True
+                    i = _with_items(i, k, interval_set)
+            converted += copied
+            checked.append(i)
+        if converted > 0:
+            warnings.warn("The correct input format is a set - converted lists to sets.")
+
+        return checked, converted
 
+    @staticmethod
+    def merge_duplicates(intervals: list, key: str = "set_items") -> Tuple[list, int]:
         """
-        Utilizes a directed graph to merge intervals according to unions in 'key' and update adjacent
-        intervals to their new time ranges. If 2 comes before 3, then the intervals [1,3], [2,3] become [1], [2,3], [3].
+        Merges together intervals that span exactly the same range (e.g. start and end indices). Intervals are grouped
+        on their (start, finish) pair in a single pass and the sets of each group are folded into one union, so any
+        number of identical spans is handled in linear time.
+        :param intervals: a list of dictionaries or Interval records containing the fields 'start', 'finish' and 'key'.
+        :param key: a string which identifies the key containing the set of each interval, or a list of them. Default
+        value is 'set_items'.
+        :return: a list of intervals with unique spans, in order of first appearance, and the number of intervals
+        which were collapsed into another.
+        """
+
+        spans = dict()
+        for i in intervals:
+            spans.setdefault((i["start"], i["finish"]), list()).append(i)
+
+        unique = list()
+        for group in spans.values():
+            if len(group) == 1:
+                unique.append(group[0])
+            else:
+                # merge them into a single interval, leaving the original intervals untouched
+                interval = group[0]
+                for k in _keys(key):
+                    interval = _with_items(interval, k, set().union(*(g[k] for g in group)))
+                unique.append(interval)
+
+        return unique, len(intervals) - len(unique)
+
+    @staticmethod
+    def union(intervals: list, key: str = "set_items", engine: str = "sweep", bitset: bool = False,
+              workers: int = None, stats: "MergeStats" = None, aggregate=None, field: str = None,
+              coalesce_equal: bool = False, max_gap=None, min_duration=None, times: str = "native") -> list:
+
+        """
+        Merges intervals according to unions in 'key' and updates adjacent intervals to their new time ranges. If 2
+        comes before 3, then the intervals [1,3], [2,3] become [1], [2,3], [3].
         :param intervals: a list of dictionaries containing the fields 'start', 'finish', 'key', and
-        'group' which describe each interval.
+        'group' which describe each interval, or a list of Interval records. Neither the list nor the intervals in it
+        are modified.
         :param key: a string which identifies the key to use when merging intervals based on the sets contained in the
-        intervals. Default value is 'set_items'.
-        :return: a list of aggregated intervals (NetworkX edge objects).
+        intervals. Default value is 'set_items'. A list of keys merges several set-valued keys in a single sweep, and
+        each aggregated interval then carries the union of every key, split wherever any of them changes. Requires the
+        'sweep' engine.
+        :param engine: the merge algorithm to use. 'sweep' (default) performs a single O(n log n) sweep over the
+        interval boundaries, while 'graph' uses the original directed-graph algorithm.
+        :param bitset: if True, labels are interned into integers once and carried through the merge as bitmasks.
+        Each merged interval then holds a LabelSet, which decodes the bitmask back to labels only when read.
+        :param workers: the number of processes to merge with. When greater than one, the sorted intervals are split
+        into balanced shards at points in time where no interval is open, which are merged independently in a process
+        pool and concatenated. The output is identical to a single-process merge. Requires the 'sweep' engine.
+        :param stats: an optional MergeStats which is filled with the time spent in each phase of the merge and
+        counters describing the input and output. Nothing is measured when it is not given.
+        :param aggregate: if given, each aggregated interval carries a single reduced value under 'key' rather than a
+        copy of the union of the overlapping sets: 'count' for the number of labels, 'min' or 'max' for the smallest
+        or largest 'field' of the overlapping intervals, or an associative function of two arguments which folds
+        together the 'field' (or, without a field, the set) of the overlapping intervals. Requires the 'sweep' engine,
+        and the function must be picklable when 'workers' is used.
+        :param field: a string which identifies the key containing the value of each interval to aggregate.
+        :param coalesce_equal: if True, adjacent aggregated intervals with equal sets (or aggregates) are coalesced
+        into one as the sweep emits them. Requires the 'sweep' engine.
+        :param max_gap: if given, gaps of at most this duration between aggregated intervals are bridged by extending
+        the earlier interval up to the start of the later one. Requires the 'sweep' engine.
+        :param min_duration: if given, aggregated intervals shorter than this duration are dropped, after any
+        coalescing. Requires the 'sweep' engine.
+        :param times: how to return timestamps. Start and finish times given as pandas.Timestamp or numpy.datetime64
+        are converted once to integer nanoseconds since the epoch, which are merged much faster, and 'native' (default)
+        converts the boundaries of the aggregated intervals back to the timestamps they came from. 'epoch' returns the
+        boundaries as integer nanoseconds instead, converting datetime.datetime as well. Aware timestamps are
+        converted from their timezone.
+        :return: a MergedTimeline, i.e. a list of aggregated intervals sorted by their start time which can also answer
+        point and range queries. Aggregated intervals are Interval records if the input intervals are, and
+        dictionaries otherwise.
         """
 
-        # check to see if the sets in the interval indicated is the proper format
-        converted = False
-        for i in intervals:
-            status, interval_set = Merge.check_input_interval_set_type(i[key])
-            if status is False:
-                converted = True
-            i[key] = interval_set
-        if converted is True:
-            warnings.warn("The correct input format is a set - converted lists to sets.")
+        if engine not in ("sweep", "graph"):
+            raise ValueError("Unknown engine '{}' - expected one of 'sweep' or 'graph'.".format(engine))
+        if engine == "graph" and bitset:
+            raise ValueError("Bitset label sets are only supported by the 'sweep' engine.")
+        if engine == "graph" and workers is not None and workers > 1:
+            raise ValueError("Parallel merges are only supported by the 'sweep' engine.")
+        if engine == "graph" and aggregate is not None:
+            raise ValueError("Aggregates are only supported by the 'sweep' engine.")
+        if engine == "graph" and (coalesce_equal or max_gap is not None or min_duration is not None):
+            raise ValueError("Coalescing is only supported by the 'sweep' engine.")
+        if engine == "graph" and isinstance(key, (list, tuple)):
+            raise ValueError("Merging on several keys is only supported by the 'sweep' engine.")
+        if times not in ("native", "epoch"):
+            raise ValueError("Unknown times '{}' - expected one of 'native' or 'epoch'.".format(times))
+
+        # validate the options of the sweep before doing any work
+        options = {"bitset": bitset, "aggregate": aggregate, "field": field, "coalesce_equal": coalesce_equal,
+                   "max_gap": max_gap, "min_duration": min_duration}
+        IncrementalMerge(key=key, **options)
+
+        if stats is not None:
+            stats.engine = engine
+            stats.intervals_in = len(intervals)
+            clock = perf_counter()
+
+        # check to see if the sets in the interval indicated is the proper format, converting copies of the
+        # intervals so that the caller's intervals are never modified
+        intervals, converted = Merge._check_sets(intervals, key)
+
+        # pandas and NumPy timestamps are slow to compare, so they are merged as integers and converted back on output
+        # (datetime.datetime compares about as fast as an integer, and is only converted when integers are asked for)
+        decoded = None
+        if intervals and _is_timestamp(intervals[0]["start"]) and (
+                times == "epoch" or type(intervals[0]["start"]) is not datetime.datetime):
+            intervals, decoded = _to_epoch(intervals, key)
+            options["max_gap"] = _duration_ns(max_gap)
+            options["min_duration"] = _duration_ns(min_duration)
+
+        if stats is not None:
+            stats.converted = converted
+            clock = stats.lap("convert", clock)
 
         # first, merge together any intervals that span the same range (e.g. start and end indices)
         # the directed-graph algorithm is not intended to solve this use case which often comes up in practice
-        interval_pairs = combinations(intervals, 2)
-        for ip in interval_pairs:
+        # folding would discard the values of an aggregate, so duplicates are then left to the sweep
+        duplicates = 0
+        if aggregate is None:
+            intervals, duplicates = Merge.merge_duplicates(intervals, key)
+
+        if stats is not None:
+            stats.duplicates = duplicates
+            clock = stats.lap("duplicates", clock)
+
+        if engine == "sweep":
+            # sort the intervals by their start time to ensure a directional scan
+            intervals = sorted(intervals, key=itemgetter("start"))
+            if stats is not None:
+                clock = stats.lap("sort", clock)
+            if workers is not None and workers > 1:
+                merged, peak_open_intervals = Merge._union_parallel(intervals, key, options, workers, stats)
+            else:
+                merged, peak_open_intervals = Merge._union_sorted(intervals, key, options)
+            if stats is not None:
+                stats.peak_open_intervals = peak_open_intervals
+        else:
+            merged = Merge._union_graph(intervals, key, stats)
+            if intervals and isinstance(intervals[0], Interval):
+                merged = [Interval(m["start"], m["finish"], m[key]) for m in merged]
+
+        if stats is not None:
+            clock = stats.lap("merge", clock)
+
+        if decoded is not None and times == "native":
+            _from_epoch(merged, decoded)
+        timeline = MergedTimeline(merged, key=key)
+
+        if stats is not None:
+            stats.segments_out = len(timeline)
+            stats.lap("export", clock)
+
+        return timeline
+
+    @staticmethod
+    def union_merged(timelines: list, key=None) -> "MergedTimeline":
+        """
+        Merges timelines which were already merged, e.g. the output of Merge.union for each day of a mission, into one.
+        The merged intervals of each timeline are sorted and never overlap, so their boundaries are walked in a single
+        k-way pass which holds at most one open interval per timeline, in O(n log k) for n merged intervals over k
+        timelines. The result is the same as merging all of the original intervals at once, except that intervals
+        without duration are not known to the timelines and so no longer split the intervals of other timelines.
+        :param timelines: a list of lists of merged intervals, such as MergedTimelines, each sorted by start time and
+        not overlapping.
+        :param key: the key containing the set of each merged interval, or a list of them. Defaults to the key of the
+        first MergedTimeline, or 'set_items'.
+        :return: a MergedTimeline containing the merged intervals of every timeline.
+        """
+
+        timelines = [t for t in timelines if len(t)]
+        if key is None:
+            key = next((t.key for t in timelines if isinstance(t, MergedTimeline)), "set_items")
+        keys = _keys(key)
+        make = IncrementalMerge(key=key, records=bool(timelines) and isinstance(timelines[0][0], Interval))._make
+
+        # each timeline has a single pending boundary: the start of its next merged interval, or the finish of the one
+        # which is open
+        boundaries = [(t[0]["start"], n) for n, t in enumerate(timelines)]
+        heapify(boundaries)
+        positions = [0] * len(timelines)
+        active = dict()
+        cursor = None
+        merged = list()
+        while boundaries:
+            time = boundaries[0][0]
+            if active and cursor < time:
+                sets = [[a[k] for a in active.values()] for k in keys]
+                value = tuple(set(s[0]) if len(s) == 1 else set().union(*s) for s in sets)
+                merged.append(make(cursor, time, value if len(keys) > 1 else value[0]))
+            cursor = time
+
+            while boundaries and boundaries[0][0] == time:
+                n = heappop(boundaries)[1]
+                timeline = timelines[n]
+                if n in active:
+                    del active[n]
+                    positions[n] += 1
+                    if positions[n] < len(timeline):
+                        heappush(boundaries, (timeline[positions[n]]["start"], n))
+                else:
+                    active[n] = timeline[positions[n]]
+                    heappush(boundaries, (active[n]["finish"], n))
+
+        return MergedTimeline(merged, key=key)
+
+    @staticmethod
+    def overlay(a: list, b: list, key=None) -> "MergedTimeline":
+        """
+        Merges two timelines which were already merged, e.g. the output of Merge.union for two detector families, in a
+        single walk over their boundaries in O(n + m) (see union_merged).
+        :param a: a list of merged intervals sorted by start time, such as a MergedTimeline.
+        :param b: another list of merged intervals sorted by start time.
+        :param key: the key containing the set of each merged interval. Defaults to the key of a MergedTimeline, or
+        'set_items'.
+        :return: a MergedTimeline containing the merged intervals of both timelines.
+        """
+        return Merge.union_merged([a, b], key=key)
+
+    @staticmethod
+    def union_by(intervals: list, group_key: str = "group", key: str = "set_items", bitset: bool = False,
+                 workers: int = None, aggregate=None, field: str = None, coalesce_equal: bool = False, max_gap=None,
+                 min_duration=None) -> dict:
+        """
+        Merges many independent groups of intervals (e.g. per sensor or per channel) in a single call. The intervals
+        are sorted once by group and start time, and every group is then merged in one pass over the sorted list.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish', 'key' and 'group_key'. Groups
+        must be comparable with one another. Neither the list nor the intervals in it are modified.
+        :param group_key: a string which identifies the key containing the group of each interval. Default value is
+        'group'.
+        :param key: a string which identifies the key to use when merging intervals based on the sets contained in the
+        intervals, or a list of them (see union). Default value is 'set_items'.
+        :param bitset: if True, labels are carried through the merge as bitmasks.
+        :param workers: the number of processes to merge with. When greater than one, the groups are split into
+        contiguous batches of roughly equal size which are merged in a process pool.
+        :param aggregate: if given, each aggregated interval carries a reduced value instead of a set (see union).
+        :param field: a string which identifies the key containing the value of each interval to aggregate.
+        :param coalesce_equal: if True, adjacent aggregated intervals with equal sets are coalesced (see union).
+        :param max_gap: if given, gaps of at most this duration between aggregated intervals are bridged (see union).
+        :param min_duration: if given, aggregated intervals shorter than this duration are dropped (see union).
+        :return: a dictionary mapping each group to the MergedTimeline of its intervals, in sorted order of group.
+        """
+
+        if intervals and isinstance(intervals[0], Interval):
+            raise ValueError("Interval records hold no group, so they cannot be merged by group.")
+
+        # check to see if the sets in the interval indicated is the proper format
+        checked, _ = Merge._check_sets(intervals, key)
+
+        options = {"bitset": bitset, "aggregate": aggregate, "field": field, "coalesce_equal": coalesce_equal,
+                   "max_gap": max_gap, "min_duration": min_duration}
+        ordered = sorted(checked, key=lambda i: (i[group_key], i["start"]))
+
+        if workers is not None and workers > 1:
+            # cut the sorted intervals into batches of whole groups
+            size = max(-(-len(ordered) // workers), 1)
+            batches = list()
+            begin = 0
+            for n in range(1, len(ordered)):
+                if n - begin >= size and ordered[n][group_key] != ordered[n - 1][group_key]:
+                    batches.append(ordered[begin:n])
+                    begin = n
+            batches.append(ordered[begin:])
+
+            merged = list()
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+                for out in executor.map(Merge._union_groups, batches, repeat(group_key), repeat(key), repeat(options)):
+                    merged.extend(out)
+        else:
+            merged = Merge._union_groups(ordered, group_key, key, options)
+
+        return {group: MergedTimeline(segments, key=key) for group, segments in merged}
+
+    @staticmethod
+    def _union_groups(intervals: list, group_key: str, key: str, options: dict) -> list:
+        """
+        Merges every group of intervals sorted by group and start time in a single pass.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish', 'key' and 'group_key', sorted
+        by group and then by start.
+        :param group_key: a string which identifies the key containing the group of each interval.
+        :param key: a string which identifies the key containing the set of each interval.
+        :param options: the keyword arguments of each IncrementalMerge, such as 'bitset'.
+        :return: a list of (group, aggregated intervals) pairs, in the order of the input.
+        """
+
+        merged = list()
+        merge = None
+        group = None
+        for i in intervals:
+            if merge is None or i[group_key] != group:
+                if merge is not None:
+                    segments.extend(merge.flush())
+                    merged.append((group, segments))
+                group = i[group_key]
+                merge = IncrementalMerge(key=key, **options)
+                segments = list()
+            segments.extend(merge.push(i))
+        if merge is not None:
+            segments.extend(merge.flush())
+            merged.append((group, segments))
+
+        return merged
+
+    @staticmethod
+    def union_arrays(starts, finishes, labels: tuple) -> tuple:
+        """
+        Merges intervals held in columnar form. Each interval i spans [starts[i], finishes[i]) and carries the integer
+        label codes codes[offsets[i]:offsets[i + 1]], where (codes, offsets) is passed as 'labels'. The sort, boundary
+        extraction and segment assignment are vectorized with NumPy, so no dictionaries or sets are built along the
+        way. Requires NumPy.
+        :param starts: an array containing the start of each interval.
+        :param finishes: an array containing the finish of each interval.
+        :param labels: a tuple of (codes, offsets) arrays describing the label codes of each interval.
+        :return: a tuple of (starts, finishes, (codes, offsets)) describing the merged segments in the same layout as
+        the input, with the label codes of each segment sorted and unique.
+        """
+
+        import numpy as np
+
+        starts = np.asarray(starts)
+        finishes = np.asarray(finishes)
+        codes = np.asarray(labels[0], dtype=np.int64)
+        offsets = np.asarray(labels[1], dtype=np.int64)
+        if starts.shape != finishes.shape or offsets.shape != (starts.size + 1,):
+            raise ValueError("Expected starts and finishes of equal length and one more offset than intervals.")
+
+        # every distinct start and finish is a segment boundary
+        boundaries = np.unique(np.concatenate([starts, finishes]))
+        first = np.searchsorted(boundaries, starts)
+        last = np.searchsorted(boundaries, finishes)
+        spans = np.maximum(last - first, 0)
+
+        # keep only the segments covered by at least one interval, dropping any gaps in between
+        coverage = np.cumsum(
+            np.bincount(first, minlength=boundaries.size) - np.bincount(last, minlength=boundaries.size)
+        )[:-1]
+        covered = coverage > 0
+        segment_index = np.cumsum(covered) - 1
+
+        # repeat each label code once for every segment its interval spans
+        owners = np.repeat(np.arange(starts.size), np.diff(offsets))
+        repeats = spans[owners]
+        total = int(repeats.sum())
+        run_starts = np.repeat(np.cumsum(repeats) - repeats, repeats)
+        segments = np.repeat(first[owners], repeats) + np.arange(total) - run_starts
+        pair_codes = np.repeat(codes, repeats)
+
+        # deduplicate the (segment, code) pairs, which also sorts them by segment and then by code
+        width = int(codes.max()) + 1 if codes.size else 1
+        pairs = np.unique(segments * width + pair_codes)
+        out_codes = pairs % width
+        out_counts = np.bincount(segment_index[pairs // width], minlength=int(covered.sum()))
+        out_offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(out_counts)])
+
+        return boundaries[:-1][covered], boundaries[1:][covered], (out_codes, out_offsets)
+
+    @staticmethod
+    def runs(times, columns: dict, finish=None, ignore=()) -> tuple:
+        """
+        Extracts intervals from labels or flags sampled over time, such as the class column of a data set or the
+        output of a detector. Each run of equal consecutive values in a column becomes an interval, found with
+        vectorized comparisons rather than a loop over the samples. Requires NumPy.
+        :param times: an array containing the time of each sample, sorted in ascending order.
+        :param columns: a dictionary mapping the name of each column to an array with one value per sample. Runs of
+        True in a boolean column are labelled with the name of the column, and runs of any other column are labelled
+        with a tuple of (name, value). Runs of False in a boolean column are ignored.
+        :param finish: the time at which the last sample ends. Defaults to the time of the last sample plus the spacing
+        of the last two samples, and is required when there is a single sample.
+        :param ignore: values for which no interval is extracted, such as the class of normal samples.
+        :return: a tuple of (starts, finishes, (codes, offsets), vocabulary) in the layout of Merge.union_arrays, where
+        vocabulary maps each label code to its label.
+        """
 
-            # if the start and end times are the same
-            if (ip[0]["start"] == ip[1]["start"]) & (ip[0]["finish"] == ip[1]["finish"]):
-                # merge them into a single interval
-                interval_new = ip[0]
-                interval_new[key] = interval_new[key].union(ip[1][key])
+        import numpy as np
 
-                # remove the old intervals from the input list (removes first matching value)
-                intervals.remove(ip[0])
-                intervals.remove(ip[1])
+        times = np.asarray(times)
+        if times.ndim != 1:
+            raise ValueError("Expected a one-dimensional array of sample times.")
+        if times.size > 1 and np.any(times[1:] < times[:-1]):
+            raise ValueError("Sample times must be sorted in ascending order.")
+        if finish is None and times.size == 1:
+            raise ValueError("The end of a single sample cannot be inferred - pass a finish.")
+        if finish is None and times.size:
+            finish = times[-1] + (times[-1] - times[-2])
+        # each sample lasts until the next one starts
+        ends = np.concatenate([times[1:], np.asarray([finish], dtype=times.dtype)]) if times.size else times
+
+        starts, finishes, codes, vocabulary = list(), list(), list(), list()
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.shape != times.shape:
+                raise ValueError("Column '{}' does not have one value per sample.".format(name))
+            # a run begins at the first sample and wherever the value changes
+            change = np.concatenate([np.ones(min(values.size, 1), dtype=bool), values[1:] != values[:-1]])
+            first = np.flatnonzero(change)
+            last = np.concatenate([first[1:], [values.size]]) - 1
+            run_values = values[first]
+            if values.dtype == bool:
+                keep = run_values
+            else:
+                keep = ~np.isin(run_values, list(ignore))
+            first, last, run_values = first[keep], last[keep], run_values[keep]
+
+            if values.dtype == bool:
+                run_codes = np.full(first.size, len(vocabulary), dtype=np.int64)
+                vocabulary.append(name)
+            else:
+                labels, inverse = np.unique(run_values, return_inverse=True)
+                run_codes = inverse.astype(np.int64) + len(vocabulary)
+                vocabulary.extend((name, v) for v in labels.tolist())
+            starts.append(times[first])
+            finishes.append(ends[last])
+            codes.append(run_codes)
+
+        starts = np.concatenate(starts) if starts else times[:0]
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+        return (starts, np.concatenate(finishes) if finishes else times[:0],
+                (codes, np.arange(codes.size + 1, dtype=np.int64)), vocabulary)
+
+    @staticmethod
+    def union_runs(times, columns: dict, finish=None, ignore=(), key: str = "set_items") -> "MergedTimeline":
+        """
+        Extracts intervals from labels or flags sampled over time with Merge.runs and merges them with
+        Merge.union_arrays. Only the merged intervals, rather than the samples, are converted to dictionaries.
+        Requires NumPy.
+        :param times: an array containing the time of each sample, sorted in ascending order.
+        :param columns: a dictionary mapping the name of each column to an array with one value per sample.
+        :param finish: the time at which the last sample ends (see Merge.runs).
+        :param ignore: values for which no interval is extracted, such as the class of normal samples.
+        :param key: the key under which the labels of each merged interval are returned.
+        :return: a MergedTimeline containing the merged intervals.
+        """
+
+        import numpy as np
+
+        starts, finishes, labels, vocabulary = Merge.runs(times, columns, finish=finish, ignore=ignore)
+        starts, finishes, (codes, offsets) = Merge.union_arrays(starts, finishes, labels)
+        if np.issubdtype(starts.dtype, np.datetime64):
+            # datetime64 only converts to datetime.datetime with up to microsecond precision
+            starts, finishes = starts.astype("datetime64[us]"), finishes.astype("datetime64[us]")
+        codes = codes.tolist()
+        offsets = offsets.tolist()
+
+        return MergedTimeline([
+            {"start": s, "finish": f, key: {vocabulary[c] for c in codes[offsets[n]:offsets[n + 1]]}}
+            for n, (s, f) in enumerate(zip(starts.tolist(), finishes.tolist()))
+        ], key=key)
+
+    @staticmethod
+    def union_frame(frame, start: str = "start", finish: str = "finish", label: str = "label",
+                    explode: bool = True):
+        """
+        Merges intervals held in a pandas DataFrame with one interval per row. The columns are factorized and passed
+        to Merge.union_arrays as they are, so no dictionaries or sets are built for each row. Requires pandas.
+        :param frame: a DataFrame with a column for the start, finish and label of each interval. The label column
+        may hold a single label or a list of labels per row, and rows without a label are ignored.
+        :param start: the name of the column containing the start of each interval.
+        :param finish: the name of the column containing the finish of each interval.
+        :param label: the name of the column containing the labels of each interval.
+        :param explode: if True (default), the output holds one row for each label of each merged interval, with the
+        labels in a categorical column. If False, the output holds one row for each merged interval, with its labels
+        in a set, which is slower to build.
+        :return: a DataFrame sorted by start time, with the start, finish and labels of each merged interval in columns
+        named as in the input.
+        """
+
+        import numpy as np
+        import pandas as pd
+
+        labels = frame[label]
+        owners = np.arange(len(frame))
+        if labels.dtype == object and labels.map(pd.api.types.is_list_like).any():
+            labels = labels.explode()
+            owners = np.repeat(owners, frame[label].map(lambda v: max(len(v), 1) if pd.api.types.is_list_like(v)
+                                                        else 1).to_numpy())
+        present = labels.notna().to_numpy()
+        codes, categories = pd.factorize(labels[present], sort=True)
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64),
+                                  np.cumsum(np.bincount(owners[present], minlength=len(frame)))])
+
+        # timezone-aware columns are merged as naive UTC, since datetime64 carries no timezone
+        times = list()
+        timezone = None
+        for column in (frame[start], frame[finish]):
+            if isinstance(column.dtype, pd.DatetimeTZDtype):
+                timezone = column.dt.tz
+                column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+            times.append(column.to_numpy())
+
+        # rows without a label must not open a segment of their own
+        keep = np.diff(offsets) > 0
+        kept_offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(np.diff(offsets)[keep])])
+        starts, finishes, (codes, offsets) = Merge.union_arrays(times[0][keep], times[1][keep], (codes, kept_offsets))
+
+        if explode:
+            counts = np.diff(offsets)
+            starts = np.repeat(starts, counts)
+            finishes = np.repeat(finishes, counts)
+            values = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            values = [set(categories[codes[offsets[n]:offsets[n + 1]]]) for n in range(starts.size)]
+
+        out = pd.DataFrame({start: starts, finish: finishes, label: values})
+        if timezone is not None:
+            out[start] = out[start].dt.tz_localize("UTC").dt.tz_convert(timezone)
+            out[finish] = out[finish].dt.tz_localize("UTC").dt.tz_convert(timezone)
+
+        return out
+
+    @staticmethod
+    def _union_sorted(intervals: list, key: str, options: dict) -> Tuple[list, int]:
+        """
+        Merges intervals which are already sorted by their start time with a single sweep.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish' and 'key', sorted by 'start'.
+        :param key: a string which identifies the key containing the set of each interval.
+        :param options: the keyword arguments of the IncrementalMerge, such as 'bitset'.
+        :return: a list of aggregated intervals sorted by their start time, and the peak number of open intervals.
+        """
+        records = bool(intervals) and isinstance(intervals[0], Interval)
+        merge = IncrementalMerge(key=key, records=records, **options)
+        merged = list(merge.extend(intervals))
+        merged.extend(merge.flush())
+        return merged, merge.peak_open_intervals
+
+    @staticmethod
+    def shard(intervals: list, shards: int) -> list:
+        """
+        Splits intervals sorted by their start time into roughly equally sized shards, cutting only at points in time
+        where no interval is open. Shards never share a segment, so they can be merged independently.
+        :param intervals: a list of dictionaries containing the fields 'start' and 'finish', sorted by 'start'.
+        :param shards: the maximum number of shards to split the intervals into.
+        :return: a list of shards, each a list of intervals sorted by their start time. Fewer shards than requested are
+        returned when the intervals overlap too much to be cut evenly.
+        """
+
+        size = max(-(-len(intervals) // shards), 1)
+        pieces = list()
+        begin = 0
+        reach = None
+        for n, i in enumerate(intervals):
+            # every interval before this one finishes by the time it starts, so no segment crosses the cut
+            if n - begin >= size and reach <= i["start"]:
+                pieces.append(intervals[begin:n])
+                begin = n
+            if reach is None or reach < i["finish"]:
+                reach = i["finish"]
+        pieces.append(intervals[begin:])
+
+        return pieces
+
+    @staticmethod
+    def _union_parallel(intervals: list, key: str, options: dict, workers: int,
+                        stats: "MergeStats" = None) -> Tuple[list, int]:
+        """
+        Merges intervals sorted by their start time in a pool of processes, one shard at a time.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish' and 'key', sorted by 'start'.
+        :param key: a string which identifies the key containing the set of each interval.
+        :param options: the keyword arguments of each IncrementalMerge, such as 'bitset'.
+        :param workers: the number of processes to merge with.
+        :param stats: an optional MergeStats in which the number of shards is recorded.
+        :return: a list of aggregated intervals sorted by their start time, and the peak number of open intervals.
+        """
+
+        shards = Merge.shard(intervals, workers)
+        if stats is not None:
+            stats.shards = len(shards)
+        if len(shards) == 1:
+            return Merge._union_sorted(intervals, key, options)
+
+        # merged intervals may coalesce across the cut between two shards, so coalescing is left to this process
+        post = None
+        if options["coalesce_equal"] or options["max_gap"] is not None or options["min_duration"] is not None:
+            make = IncrementalMerge(key=key, records=isinstance(intervals[0], Interval))._make
+            post = _Coalescer(make, options["coalesce_equal"], options["max_gap"], options["min_duration"])
+            options = dict(options, coalesce_equal=False, max_gap=None, min_duration=None)
+
+        merged = list()
+        peak_open_intervals = 0
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+            for out, peak in executor.map(Merge._union_sorted, shards, repeat(key), repeat(options)):
+                if post is None:
+                    merged.extend(out)
+                else:
+                    for m in out:
+                        value = tuple(m[k] for k in key) if isinstance(key, (list, tuple)) else m[key]
+                        post.add(m["start"], m["finish"], value, merged)
+                peak_open_intervals = max(peak_open_intervals, peak)
+        if post is not None and post.pending is not None:
+            post.release(merged)
+
+        return merged, peak_open_intervals
+
+    @staticmethod
+    def _union_graph(intervals: list, key: str, stats: "MergeStats" = None) -> list:
+        """
+        Utilizes a directed graph to merge intervals according to unions in 'key' and update adjacent
+        intervals to their new time ranges.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish' and 'key'.
+        :param key: a string which identifies the key containing the set of each interval.
+        :param stats: an optional MergeStats in which the number of edge splits made by each branch is counted.
+        :return: a list of aggregated intervals (NetworkX edge objects).
+        """
 
-                # add the new interval
-                intervals.append(interval_new)
+        # NetworkX is only needed by this engine, so it is not imported until the engine is used
+        import networkx as nx
 
         # create a directed Graph
         graph = nx.DiGraph()
@@ -108,6 +1834,8 @@ class Merge:
                     # check to see if the interval ends before the considered pair
                     # if so, pair start to interval start, interval start to interval end, and interval end to pair end
                     if intervals[i]["finish"] < pairs[p][1]:
+                        if stats is not None:
+                            stats.split("start_within_finish_within")
                         # gather the adjacent attributes
                         left_attrs = set(graph[pairs[p][0]][pairs[p][1]][key])
                         right_attrs = set(intervals[i][key]).union(left_attrs)
@@ -127,6 +1855,8 @@ class Merge:
 
                     # check if the interval ends outside of the previous one
                     if pairs[p][1] <= intervals[i]["finish"]:
+                        if stats is not None:
+                            stats.split("start_within_finish_after")
 
                         # first make an alteration based on the start
                         left_attrs = set(graph[pairs[p][0]][pairs[p][1]][key])
@@ -153,6 +1883,8 @@ class Merge:
 
                     # if the current interval ends before
                     if intervals[i]["finish"] < pairs[p][1]:
+                        if stats is not None:
+                            stats.split("same_start_finish_before")
                         # gather the adjacent attributes
                         left_attrs = set(graph[pairs[p][0]][pairs[p][1]][key]).union(
                             intervals[i][key])
@@ -171,6 +1903,8 @@ class Merge:
 
                     # if they start at the same time but the current interval ends after
                     if pairs[p][1] < intervals[i]["finish"]:
+                        if stats is not None:
+                            stats.split("same_start_finish_after")
                         # gather the adjacent attributes
                         graph[pairs[p][0]][pairs[p][1]][key] = graph[pairs[p][0]][pairs[p][1]][key].union(
                             intervals[i][key])
@@ -185,6 +1919,8 @@ class Merge:
 
                     # if it ends before
                     if intervals[i]["finish"] < pairs[p][1]:
+                        if stats is not None:
+                            stats.split("start_before_finish_before")
                         # gather the adjacent attributes
                         left_attrs = set(graph[pairs[p][0]][pairs[p][1]][key]).union(
                             intervals[i][key])
@@ -203,6 +1939,8 @@ class Merge:
 
                     # if it ends after
                     if pairs[p][1] < intervals[i]["finish"]:
+                        if stats is not None:
+                            stats.split("start_before_finish_after")
                         # gather the adjacent attributes
                         left_attrs = set(graph[pairs[p][0]][pairs[p][1]][key]).union(
                             intervals[i][key])
@@ -223,7 +1961,7 @@ class Merge:
         intervals = list()
         for e in graph_edges:
             intervals.append(
-                {"start": e[0], "finish": e[1], key: e[2][key]}
+                {"start": e[0], "finish": e[1], key: set(e[2][key])}
             )
 
         return intervals
@@ -0,0 +1,366 @@
+"""
+========================================================================================================
+Copyright 2020, by the California Institute of Technology. ALL RIGHTS RESERVED.
+United States Government Sponsorship acknowledged. Any commercial use must be negotiated with the Office of Technology
+Transfer at the California Institute of Technology. This software may be subject to U.S. export control laws. By
+accepting this software, the user agrees to comply with all applicable U.S. export laws and regulations. User has the
+responsibility to obtain export licenses, or other export authority as may be required before exporting such
+information to foreign countries or providing access to foreign persons.
+========================================================================================================
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import io
+import json
+import os
+import socket
+
+from mieda.external import IntervalWriter, read_intervals
+from mieda.intervals import Merge, MergedTimeline
+
+
+# the options of Merge.union which a request may set, all of which leave a set in each merged interval
+OPTIONS = ("bitset", "coalesce_equal", "max_gap", "min_duration")
+# the options which are durations, sent in seconds when the intervals carry timestamps
+DURATIONS = ("max_gap", "min_duration")
+
+# the protocol is a sequence of requests on a single connection, each a JSON header line followed by its payload:
+# 'count' JSON lines of intervals for the 'jsonl' format, or the raw bytes of starts, finishes, offsets and codes
+# for the 'columnar' format. Responses are laid out the same way.
+
+
+def _columnar_size(header: dict) -> int:
+    """
+    Computes the size of the payload of a columnar request or response.
+    :param header: the header, containing the number of intervals ('count'), the number of label codes ('codes') and
+    the dtype of the times ('dtype').
+    :return: the number of bytes which follow the header.
+    """
+    import numpy as np
+    count, codes = int(header["count"]), int(header["codes"])
+    return 2 * count * np.dtype(header["dtype"]).itemsize + 8 * (count + 1) + 8 * codes
+
+
+def _pack_columns(starts, finishes, codes, offsets) -> tuple:
+    """
+    Packs merged intervals in the columnar layout of Merge.union_arrays into bytes.
+    :return: a tuple of (header, payload) describing the columns, without a request id.
+    """
+    import numpy as np
+    starts, finishes = np.asarray(starts), np.asarray(finishes)
+    if starts.shape != finishes.shape or np.shape(offsets) != (starts.size + 1,):
+        raise ValueError("Expected starts and finishes of equal length and one more offset than intervals.")
+    dtype = starts.dtype.newbyteorder("<")
+    header = {"format": "columnar", "count": int(starts.size), "codes": int(np.size(codes)), "dtype": dtype.str}
+    payload = b"".join([
+        starts.astype(dtype).tobytes(), finishes.astype(dtype).tobytes(),
+        np.asarray(offsets).astype("<i8").tobytes(), np.asarray(codes).astype("<i8").tobytes()
+    ])
+    return header, payload
+
+
+def _unpack_columns(header: dict, payload: bytes) -> tuple:
+    """
+    Unpacks the payload of a columnar request or response.
+    :return: a tuple of (starts, finishes, (codes, offsets)).
+    """
+    import numpy as np
+    count, dtype = int(header["count"]), np.dtype(header["dtype"])
+    times = np.frombuffer(payload, dtype=dtype, count=2 * count)
+    rest = np.frombuffer(payload, dtype="<i8", offset=2 * count * dtype.itemsize)
+    return times[:count], times[count:], (rest[count + 1:], rest[:count + 1])
+
+
+def _merge(header: dict, payload: bytes) -> tuple:
+    """
+    Merges the intervals of a single request.
+    :param header: the header of the request.
+    :param payload: the payload of the request.
+    :return: a tuple of (header, payload) of the response, without a request id.
+    """
+
+    if header.get("format", "jsonl") == "columnar":
+        starts, finishes, labels = _unpack_columns(header, payload)
+        starts, finishes, (codes, offsets) = Merge.union_arrays(starts, finishes, labels)
+        return _pack_columns(starts, finishes, codes, offsets)
+
+    key = header.get("key", "set_items")
+    options = {o: v for o, v in header.get("options", {}).items() if o in OPTIONS}
+    parse = None
+    if header.get("time") == "iso":
+        parse = datetime.datetime.fromisoformat
+        for o in DURATIONS:
+            if options.get(o) is not None:
+                options[o] = datetime.timedelta(seconds=options[o])
+    intervals = read_intervals(io.StringIO(payload.decode()), fmt="jsonl", key=key, parse=parse)
+
+    out = io.StringIO()
+    writer = IntervalWriter(out, fmt="jsonl", key=key)
+    for merged in Merge.union(list(intervals), key=key, **options):
+        writer.write(merged)
+    return {"format": "jsonl", "count": writer.written}, out.getvalue().encode()
+
+
+def _merge_batch(requests: list) -> list:
+    """
+    Merges a batch of requests in a worker process. Each request is merged on its own, and a request which fails does
+    not fail the others.
+    :param requests: a list of (header, payload) tuples.
+    :return: a list of (header, payload) tuples of the responses, in the same order.
+    """
+    responses = list()
+    for header, payload in requests:
+        try:
+            responses.append(_merge(header, payload))
+        except Exception as e:
+            responses.append(({"count": 0, "error": "{}: {}".format(type(e).__name__, e)}, b""))
+    return responses
+
+
+class MergeServer:
+    """
+    A long-lived merge service listening on a local TCP port or Unix socket. Requests arriving from any number of
+    connections within a short window are coalesced into batches, which are spread over a pool of worker processes
+    that stay warm between requests, and each response is streamed back on the connection its request came from.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, path: str = None, workers: int = None,
+                 batch_size: int = 64, linger: float = 0.002) -> None:
+        """
+        :param host: the address to listen on. Defaults to the loopback interface.
+        :param port: the TCP port to listen on, or 0 to pick a free port.
+        :param path: the path of a Unix socket to listen on instead of a TCP port.
+        :param workers: the number of worker processes to merge with. Defaults to the number of CPUs.
+        :param batch_size: the maximum number of requests merged in a single batch.
+        :param linger: the time in seconds to wait for more requests before merging a batch which is not full.
+        """
+        if batch_size < 1:
+            raise ValueError("The batch size must be a positive integer.")
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.address = None
+        self.requests = 0
+        self.batches = 0
+        self._server = None
+        self._pool = None
+        self._size = None
+        self._queue = None
+        self._batcher = None
+        self._pending = set()
+
+    async def start(self) -> None:
+        """
+        Starts the worker pool and begins listening. The address actually bound is stored in 'address'.
+        """
+        loop = asyncio.get_running_loop()
+        self._size = self.workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self._size)
+        # import mieda in the workers before the first request arrives
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _merge_batch, []) for _ in range(self._size)))
+
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batch())
+        if self.path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+            self.address = self.path
+        else:
+            self._server = await asyncio.start_server(self._handle, host=self.host, port=self.port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self) -> None:
+        """
+        Starts the server if needed and serves requests until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """
+        Stops listening, waits for the batches in flight and shuts the worker pool down.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    header = json.loads(line)
+                    if header.get("format", "jsonl") == "columnar":
+                        payload = await reader.readexactly(_columnar_size(header))
+                    else:
+                        payload = b"".join([await reader.readline() for _ in range(int(header["count"]))])
+                except (ValueError, KeyError, TypeError, ImportError, asyncio.IncompleteReadError) as e:
+                    # the rest of the stream cannot be framed, so the connection is closed after replying
+                    writer.write(json.dumps({"count": 0, "error": "Malformed request: {}".format(e)}).encode() + b"\n")
+                    break
+
+                future = loop.create_future()
+                self._queue.put_nowait(((header, payload), future))
+                response, body = await future
+                response["id"] = header.get("id")
+                writer.write(json.dumps(response).encode() + b"\n" + body)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _batch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    break
+            # batches are dispatched without waiting, so that the next one fills while this one is merged
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _dispatch(self, batch: list) -> None:
+        self.requests += len(batch)
+        self.batches += 1
+        # the batch is split into about one chunk per worker, so that a burst of requests is merged in parallel
+        size = -(-len(batch) // self._size)
+        await asyncio.gather(*(self._dispatch_chunk(batch[n:n + size]) for n in range(0, len(batch), size)))
+
+    async def _dispatch_chunk(self, chunk: list) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            responses = await loop.run_in_executor(self._pool, _merge_batch, [request for request, _ in chunk])
+        except Exception as e:
+            responses = [({"count": 0, "error": "{}: {}".format(type(e).__name__, e)}, b"")] * len(chunk)
+        for (_, future), response in zip(chunk, responses):
+            if not future.done():
+                future.set_result(response)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, path: str = None, workers: int = None, batch_size: int = 64,
+          linger: float = 0.002) -> None:
+    """
+    Runs a MergeServer until interrupted. The arguments are those of MergeServer.
+    """
+    server = MergeServer(host=host, port=port, path=path, workers=workers, batch_size=batch_size, linger=linger)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+class Client:
+    """
+    A blocking client of a MergeServer. A client holds a single connection, over which its requests are answered in
+    order, so each process or thread should use its own client.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, path: str = None, timeout: float = None) -> None:
+        """
+        :param host: the address of the server.
+        :param port: the TCP port of the server.
+        :param path: the path of the Unix socket of the server, used instead of a TCP port.
+        :param timeout: the time in seconds to wait for a response before raising socket.timeout.
+        """
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._stream = self._socket.makefile("rwb")
+        self._requests = 0
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the server.
+        """
+        self._stream.close()
+        self._socket.close()
+
+    def _request(self, header: dict, payload: bytes) -> tuple:
+        self._requests += 1
+        header["id"] = self._requests
+        self._stream.write(json.dumps(header).encode() + b"\n" + payload)
+        self._stream.flush()
+
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        response = json.loads(line)
+        if "error" in response:
+            raise ValueError(response["error"])
+        if response.get("format") == "columnar":
+            return response, self._stream.read(_columnar_size(response))
+        return response, b"".join(self._stream.readline() for _ in range(response["count"]))
+
+    def union(self, intervals: list, key: str = "set_items", **options) -> MergedTimeline:
+        """
+        Merges intervals on the server, as Merge.union would. Timestamps are sent in ISO 8601 and parsed back.
+        :param intervals: a list of dictionaries containing the fields 'start', 'finish' and 'key'.
+        :param key: a string which identifies the key containing the set of each interval.
+        :param options: the options of Merge.union to pass on, any of 'bitset', 'coalesce_equal', 'max_gap' and
+        'min_duration'. With timestamps, 'max_gap' and 'min_duration' are timedeltas or numbers of seconds.
+        :return: a MergedTimeline containing the merged intervals.
+        """
+        unknown = set(options) - set(OPTIONS)
+        if unknown:
+            raise ValueError("Unsupported options: {}.".format(", ".join(sorted(unknown))))
+
+        iso = bool(intervals) and isinstance(intervals[0]["start"], datetime.datetime)
+        options = {o: v.total_seconds() if isinstance(v, datetime.timedelta) else v for o, v in options.items()}
+        out = io.StringIO()
+        writer = IntervalWriter(out, fmt="jsonl", key=key)
+        for i in intervals:
+            writer.write(i)
+        header = {"format": "jsonl", "count": writer.written, "key": key, "options": options}
+        if iso:
+            header["time"] = "iso"
+
+        _, payload = self._request(header, out.getvalue().encode())
+        parse = datetime.datetime.fromisoformat if iso else None
+        return MergedTimeline(read_intervals(io.StringIO(payload.decode()), fmt="jsonl", key=key, parse=parse),
+                              key=key)
+
+    def union_arrays(self, starts, finishes, labels: tuple) -> tuple:
+        """
+        Merges intervals held in columnar form on the server, as Merge.union_arrays would. The columns are sent as raw
+        bytes rather than JSON. Requires NumPy.
+        :param starts: an array containing the start of each interval.
+        :param finishes: an array containing the finish of each interval.
+        :param labels: a tuple of (codes, offsets) arrays describing the label codes of each interval.
+        :return: a tuple of (starts, finishes, (codes, offsets)) describing the merged segments.
+        """
+        header, payload = _pack_columns(starts, finishes, labels[0], labels[1])
+        response, payload = self._request(header, payload)
+        return _unpack_columns(response, payload)
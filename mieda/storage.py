@@ -0,0 +1,221 @@
+"""
+========================================================================================================
+Copyright 2020, by the California Institute of Technology. ALL RIGHTS RESERVED.
+United States Government Sponsorship acknowledged. Any commercial use must be negotiated with the Office of Technology
+Transfer at the California Institute of Technology. This software may be subject to U.S. export control laws. By
+accepting this software, the user agrees to comply with all applicable U.S. export laws and regulations. User has the
+responsibility to obtain export licenses, or other export authority as may be required before exporting such
+information to foreign countries or providing access to foreign persons.
+========================================================================================================
+"""
+
+from collections.abc import Sequence
+import datetime
+import json
+import os
+
+import numpy as np
+
+from mieda.intervals import MergedTimeline
+
+
+VERSION = 1
+COLUMNS = ("starts", "finishes", "codes", "offsets")
+
+
+def save_arrays(path: str, starts, finishes, codes, offsets, vocabulary: list, key: str = "set_items") -> None:
+    """
+    Saves merged intervals held in columnar form, e.g. the output of Merge.union_arrays, to a directory. Each column is
+    written as its own .npy file so that it can be memory-mapped when loaded, and the label vocabulary is written to
+    'meta.json'.
+    :param path: the directory to write to, which is created if it does not exist.
+    :param starts: an array containing the start of each merged interval.
+    :param finishes: an array containing the finish of each merged interval.
+    :param codes: an array containing the label codes of every merged interval.
+    :param offsets: an array such that the codes of merged interval i are codes[offsets[i]:offsets[i + 1]].
+    :param vocabulary: a list mapping each label code to its label. Labels must be strings, numbers, booleans, None
+    or tuples of them, such as the labels of Merge.runs.
+    :param key: the key under which the labels of each merged interval are returned when loaded.
+    """
+
+    if isinstance(key, (list, tuple)):
+        raise ValueError("Only intervals merged on a single key can be saved.")
+    vocabulary = list(vocabulary)
+    for label in vocabulary:
+        try:
+            restored = _restore(json.loads(json.dumps(label)))
+        except (TypeError, ValueError):
+            restored = None
+        if restored != label or type(restored) is not type(label):
+            raise ValueError("The label {!r} cannot be saved - labels must be strings, numbers, booleans, None or "
+                             "tuples of them.".format(label))
+
+    starts = np.asarray(starts)
+    time = "datetime" if np.issubdtype(starts.dtype, np.datetime64) else "numeric"
+
+    os.makedirs(path, exist_ok=True)
+    for name, column in zip(COLUMNS, (starts, finishes, codes, offsets)):
+        np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(column))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"version": VERSION, "key": key, "time": time, "vocabulary": vocabulary}, f)
+
+
+def save(timeline: list, path: str, key: str = None) -> None:
+    """
+    Saves the output of Merge.union to a directory in a columnar binary layout: arrays of starts and finishes, the
+    label codes of every merged interval with their offsets, and a label vocabulary. Timestamps are stored as
+    datetime64 with microsecond precision, and timezone-aware timestamps are stored and loaded back as naive UTC.
+    :param timeline: a list of merged intervals sorted by their start time, such as a MergedTimeline.
+    :param path: the directory to write to, which is created if it does not exist.
+    :param key: the key containing the set of each merged interval. Defaults to the key of a MergedTimeline, or
+    'set_items'.
+    """
+
+    key = getattr(timeline, "key", "set_items") if key is None else key
+    if isinstance(key, (list, tuple)):
+        raise ValueError("Only intervals merged on a single key can be saved.")
+
+    index = dict()
+    codes = list()
+    offsets = [0]
+    for i in timeline:
+        for item in i[key]:
+            codes.append(index.setdefault(item, len(index)))
+        offsets.append(len(codes))
+
+    starts = [i["start"] for i in timeline]
+    finishes = [i["finish"] for i in timeline]
+    if starts and isinstance(starts[0], datetime.datetime):
+        starts = np.array([_to_utc(t) for t in starts], dtype="datetime64[us]")
+        finishes = np.array([_to_utc(t) for t in finishes], dtype="datetime64[us]")
+
+    save_arrays(path, starts, finishes, np.array(codes, dtype=np.int64), np.array(offsets, dtype=np.int64),
+                list(index), key=key)
+
+
+def load(path: str, mmap: bool = True) -> "StoredTimeline":
+    """
+    Loads merged intervals saved with save or save_arrays.
+    :param path: the directory to read from.
+    :param mmap: if True (default), the arrays are memory-mapped read-only rather than read into memory, so that
+    several processes can share a single copy of the data through the page cache.
+    :return: a StoredTimeline over the saved arrays.
+    """
+
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != VERSION:
+        raise ValueError("Unsupported storage version '{}'.".format(meta.get("version")))
+
+    columns = [np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None) for name in COLUMNS]
+
+    return StoredTimeline(*columns, vocabulary=[_restore(label) for label in meta["vocabulary"]], key=meta["key"])
+
+
+def _restore(label):
+    # JSON has no tuples, so tuple labels such as those of Merge.runs are read back from lists
+    if isinstance(label, list):
+        return tuple(_restore(item) for item in label)
+    return label
+
+
+def _to_utc(time: datetime.datetime) -> datetime.datetime:
+    # aware timestamps are stored as naive UTC, since datetime64 carries no timezone
+    if time.tzinfo is None:
+        return time
+    return time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class StoredTimeline(Sequence):
+    """
+    A read-only view of merged intervals held in columnar arrays, as returned by load. Merged intervals are decoded
+    into dictionaries only when accessed, and point and range queries are answered by binary search over the arrays
+    without decoding anything else.
+    """
+
+    def __init__(self, starts, finishes, codes, offsets, vocabulary: list, key: str = "set_items") -> None:
+        """
+        :param starts: an array containing the start of each merged interval.
+        :param finishes: an array containing the finish of each merged interval.
+        :param codes: an array containing the label codes of every merged interval.
+        :param offsets: an array such that the codes of merged interval i are codes[offsets[i]:offsets[i + 1]].
+        :param vocabulary: a list mapping each label code to its label.
+        :param key: the key under which the labels of each merged interval are returned.
+        """
+        self.starts = starts
+        self.finishes = finishes
+        self.codes = codes
+        self.offsets = offsets
+        self.vocabulary = vocabulary
+        self.key = key
+
+    def _decode_time(self, value):
+        if isinstance(value, np.datetime64):
+            return value.astype("datetime64[us]").astype(datetime.datetime)
+        return value.item()
+
+    def _encode_time(self, value):
+        if np.issubdtype(self.starts.dtype, np.datetime64) and isinstance(value, datetime.datetime):
+            return np.datetime64(_to_utc(value), "us")
+        return value
+
+    def labels(self, n: int) -> set:
+        """
+        Decodes the labels of a single merged interval.
+        :param n: the position of the merged interval.
+        :return: the set of labels of the merged interval.
+        """
+        return {self.vocabulary[c] for c in self.codes[self.offsets[n]:self.offsets[n + 1]].tolist()}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self[i] for i in range(*n.indices(len(self)))]
+        if n < 0:
+            n += len(self)
+        if not 0 <= n < len(self):
+            raise IndexError("StoredTimeline index out of range")
+        return {
+            "start": self._decode_time(self.starts[n]),
+            "finish": self._decode_time(self.finishes[n]),
+            self.key: self.labels(n)
+        }
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, StoredTimeline)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def at(self, time) -> set:
+        """
+        Finds the labels which are active at a point in time.
+        :param time: the point in time to look up.
+        :return: the set of labels active at 'time', which is empty if no interval covers it.
+        """
+        time = self._encode_time(time)
+        n = int(np.searchsorted(self.starts, time, side="right")) - 1
+        if n >= 0 and time < self.finishes[n]:
+            return self.labels(n)
+        return set()
+
+    def overlapping(self, start, finish) -> list:
+        """
+        Finds the merged intervals which overlap a range of time.
+        :param start: the start of the range (inclusive).
+        :param finish: the finish of the range (exclusive).
+        :return: a list of the merged intervals which overlap [start, finish), sorted by their start time.
+        """
+        first = int(np.searchsorted(self.finishes, self._encode_time(start), side="right"))
+        last = int(np.searchsorted(self.starts, self._encode_time(finish), side="left"))
+        return self[first:last]
+
+    def to_timeline(self) -> MergedTimeline:
+        """
+        Decodes every merged interval.
+        :return: a MergedTimeline containing the merged intervals.
+        """
+        return MergedTimeline(self, key=self.key)
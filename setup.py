@@ -12,5 +12,14 @@ setup(
     keywords=[],
     classifiers=[],
     license='Apache License, Version 2.0',
-    install_requires=[]
+    python_requires='>=3.7',
+    install_requires=[],
+    extras_require={
+        'graph': ['networkx>=2.4'],
+        'arrays': ['numpy>=1.16'],
+        'frames': ['numpy>=1.16', 'pandas>=0.25']
+    },
+    entry_points={
+        'console_scripts': ['mieda=mieda.cli:main']
+    }
 )
\ No newline at end of file
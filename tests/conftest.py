@@ -0,0 +1,24 @@
+# Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
+# License: Apache 2.0
+
+import pytest
+import random
+
+
+# fixtures shared by the test modules
+@pytest.fixture()
+def random_intervals() -> list:
+    """
+    This fixture generates a reproducible set of randomly overlapping intervals with integer boundaries.
+    :return: a list of intervals.
+    """
+
+    rng = random.Random(0)
+    intervals = list()
+    for _ in range(200):
+        start = rng.randint(0, 500)
+        intervals.append(
+            {"start": start, "finish": start + rng.randint(1, 30), "set_items": {str(rng.randint(0, 9))}}
+        )
+
+    return intervals
@@ -0,0 +1,74 @@
+# Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
+# License: Apache 2.0
+
+from mieda.cli import main
+from mieda.external import read_intervals
+from mieda.intervals import Merge
+
+import io
+import json
+import random
+
+
+# helpers
+def _channels(intervals: list) -> list:
+    # sorts copies of the intervals by their start time and assigns each to one of two channels
+    rng = random.Random(0)
+    return sorted((dict(i, channel=rng.choice(["a", "b"])) for i in intervals), key=lambda i: i["start"])
+
+
+def _lines(intervals: list) -> str:
+    return "".join(json.dumps(dict(i, set_items=sorted(i["set_items"]))) + "\n" for i in intervals)
+
+
+# tests
+def test_merge_command(random_intervals, monkeypatch, capsys) -> None:
+    """
+    Ensures that 'mieda merge' streams the same merged intervals as Merge.union, reading from stdin.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :param monkeypatch: A fixture to replace stdin.
+    :param capsys: A fixture to capture stdout.
+    :return: None
+    """
+
+    intervals = _channels(random_intervals)
+    monkeypatch.setattr("sys.stdin", io.StringIO(_lines(intervals)))
+    assert main(["merge"]) == 0
+    out = list(read_intervals(io.StringIO(capsys.readouterr().out)))
+    assert out == Merge.union(intervals)
+
+    # grouped intervals are merged separately and carry their group
+    monkeypatch.setattr("sys.stdin", io.StringIO(_lines(intervals)))
+    assert main(["merge", "--group", "channel", "--output-format", "csv"]) == 0
+    out = list(read_intervals(io.StringIO(capsys.readouterr().out), fmt="csv", fields=("channel",)))
+    expected = Merge.union_by(intervals, group_key="channel")
+    for channel in ("a", "b"):
+        assert [
+            {k: v for k, v in i.items() if k != "channel"} for i in out if i["channel"] == channel
+        ] == expected[channel]
+
+
+def test_merge_command_files(random_intervals, tmp_path, monkeypatch, capsys) -> None:
+    """
+    Ensures that 'mieda merge' interleaves several sorted files, and sorts unsorted input only when asked.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :param tmp_path: A temporary directory in which to write the files.
+    :param monkeypatch: A fixture to replace stdin.
+    :param capsys: A fixture to capture stdout and stderr.
+    :return: None
+    """
+
+    intervals = _channels(random_intervals)
+    first, second = tmp_path / "first.jsonl", tmp_path / "second.jsonl"
+    first.write_text(_lines(intervals[::2]))
+    second.write_text(_lines(intervals[1::2]))
+    assert main(["merge", str(first), str(second)]) == 0
+    assert list(read_intervals(io.StringIO(capsys.readouterr().out))) == Merge.union(intervals)
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(_lines(intervals[::-1])))
+    assert main(["merge"]) == 1
+    assert "--sort" in capsys.readouterr().err
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(_lines(intervals[::-1])))
+    assert main(["merge", "--sort", "--chunk-size", "16", "--spill", str(tmp_path)]) == 0
+    assert list(read_intervals(io.StringIO(capsys.readouterr().out))) == Merge.union(intervals)
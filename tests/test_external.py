@@ -0,0 +1,87 @@
+# Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
+# License: Apache 2.0
+
+from mieda.external import read_intervals, sort_intervals, union_file
+from mieda.intervals import Merge
+
+import datetime
+import json
+import pytest
+
+
+# tests
+def test_sort_intervals_spills(random_intervals, tmp_path) -> None:
+    """
+    Ensures that intervals sorted in spilled chunks come back in order of their start time.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :param tmp_path: A temporary directory in which to spill.
+    :return: None
+    """
+
+    out = list(sort_intervals(random_intervals, chunk_size=16, directory=str(tmp_path)))
+    assert sorted(i["start"] for i in random_intervals) == [i["start"] for i in out]
+
+    with pytest.raises(ValueError):
+        list(sort_intervals(random_intervals, chunk_size=0))
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_union_file_jsonl(random_intervals, tmp_path, chunk_size) -> None:
+    """
+    Ensures that merging a JSON lines file matches merging the same intervals in memory, whether or not the input is
+    spilled to disk.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :param tmp_path: A temporary directory for the input and output files.
+    :param chunk_size: The number of intervals held in memory while sorting.
+    :return: None
+    """
+
+    source, destination = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    with open(str(source), "w") as f:
+        for i in random_intervals:
+            row = {"start": i["start"], "finish": i["finish"], "set_items": sorted(i["set_items"])}
+            f.write(json.dumps(row) + "\n")
+
+    expected = Merge.union([dict(i) for i in random_intervals])
+    assert union_file(str(source), str(destination), chunk_size=chunk_size) == len(expected)
+
+    with open(str(destination)) as f:
+        assert list(read_intervals(f)) == expected
+
+
+def test_union_file_csv(tmp_path) -> None:
+    """
+    Ensures that CSV files with timestamps are merged and written back as CSV.
+    :param tmp_path: A temporary directory for the input and output files.
+    :return: None
+    """
+
+    source, destination = tmp_path / "in.csv", tmp_path / "out.csv"
+    source.write_text(
+        "start,finish,set_items\n"
+        "2020-01-01T01:00:00,2020-01-04T01:00:00,1\n"
+        "2020-01-02T01:00:00,2020-01-06T01:00:00,2;3\n"
+    )
+
+    assert union_file(str(source), str(destination), chunk_size=1, parse=datetime.datetime.fromisoformat) == 3
+    assert destination.read_text().splitlines() == [
+        "start,finish,set_items",
+        "2020-01-01T01:00:00,2020-01-02T01:00:00,1",
+        "2020-01-02T01:00:00,2020-01-04T01:00:00,1;2;3",
+        "2020-01-04T01:00:00,2020-01-06T01:00:00,2;3",
+    ]
+
+
+def test_read_intervals_single_labels() -> None:
+    """
+    Ensures that a label given in JSON lines as a single value rather than a list is read as one label.
+    :return: None
+    """
+
+    lines = [
+        '{"start": 1, "finish": 2, "set_items": "ab"}',
+        '{"start": 2, "finish": 3, "set_items": ["ab", "c"]}',
+        '{"start": 3, "finish": 4, "set_items": 7}',
+        '{"start": 4, "finish": 5, "set_items": null}'
+    ]
+    assert [i["set_items"] for i in read_intervals(lines)] == [{"ab"}, {"ab", "c"}, {7}, set()]
@@ -1,10 +1,17 @@
 # Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
 # License: Apache 2.0
 
-from mieda.intervals import Merge
+from mieda.intervals import (
+    DynamicTimeline, IncrementalMerge, Interval, LabelSet, Merge, MergedTimeline, MergeStats, TimelinePyramid
+)
 
+import copy
 import datetime
+import os
 import pytest
+import random
+import subprocess
+import sys
 
 
 # fixtures
@@ -327,6 +334,98 @@ def test_interval_types(interval_inputs, interval_outputs) -> None:
         assert out == o
 
 
+@pytest.mark.parametrize("engine", ["sweep", "graph"])
+def test_engines_agree(interval_inputs, interval_outputs, complex_interval_inputs, complex_interval_outputs,
+                       engine) -> None:
+    """
+    Ensures that each of the available engines produces the same output for all scenarios.
+    :param interval_inputs: A set of all types of interval overlaps.
+    :param interval_outputs: A set of outputs for all types of interval overlaps.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :param engine: The engine used to merge the intervals.
+    :return: None
+    """
+
+    for i, o in zip(interval_inputs + complex_interval_inputs, interval_outputs + complex_interval_outputs):
+        out = Merge.union(i, engine=engine)
+        assert out == o
+
+
+def test_sweep_disjoint_intervals() -> None:
+    """
+    Ensures that the sweep engine keeps intervals which do not overlap any other interval.
+    :return: None
+    """
+
+    intervals = [
+        {"start": datetime.datetime(2020, 1, 1, 1, 0, 0), "finish": datetime.datetime(2020, 1, 2, 1, 0, 0),
+         "set_items": {"1"}},
+        {"start": datetime.datetime(2020, 1, 3, 1, 0, 0), "finish": datetime.datetime(2020, 1, 4, 1, 0, 0),
+         "set_items": {"2"}}
+    ]
+
+    out = Merge.union(intervals, engine="sweep")
+    assert out == [
+        {"start": datetime.datetime(2020, 1, 1, 1, 0, 0), "finish": datetime.datetime(2020, 1, 2, 1, 0, 0),
+         "set_items": {"1"}},
+        {"start": datetime.datetime(2020, 1, 3, 1, 0, 0), "finish": datetime.datetime(2020, 1, 4, 1, 0, 0),
+         "set_items": {"2"}}
+    ]
+
+
+def _brute_force_union(intervals: list) -> list:
+    # splits the timeline at every start and finish and collects the labels of the intervals covering each piece
+    points = sorted({i["start"] for i in intervals} | {i["finish"] for i in intervals})
+    merged = list()
+    for start, finish in zip(points, points[1:]):
+        covering = [i["set_items"] for i in intervals if i["start"] <= start and finish <= i["finish"]]
+        if covering:
+            merged.append({"start": start, "finish": finish, "set_items": set().union(*covering)})
+    return merged
+
+
+def test_sweep_brute_force() -> None:
+    """
+    Ensures that the sweep engine matches a brute-force reference on random intervals, including overlapping,
+    nested, adjacent, duplicate and zero-length intervals, and that its merged intervals never overlap.
+    :return: None
+    """
+
+    rng = random.Random(0)
+    for _ in range(500):
+        intervals = list()
+        for _ in range(rng.randint(1, 8)):
+            start = rng.randint(0, 10)
+            intervals.append({"start": start, "finish": start + rng.randint(0, 5),
+                              "set_items": set(rng.sample("abcd", rng.randint(1, 2)))})
+        out = Merge.union(intervals)
+        assert out == _brute_force_union(intervals)
+        assert all(a["finish"] <= b["start"] for a, b in zip(out, out[1:]))
+
+    # the graph engine leaves the intervals open after 'a' finishes overlapping, the sweep engine splits them
+    intervals = [
+        {"start": 0, "finish": 3, "set_items": {"a"}},
+        {"start": 1, "finish": 5, "set_items": {"b"}},
+        {"start": 2, "finish": 4, "set_items": {"c"}}
+    ]
+    assert Merge.union(intervals)[-2:] == [
+        {"start": 3, "finish": 4, "set_items": {"b", "c"}},
+        {"start": 4, "finish": 5, "set_items": {"b"}}
+    ]
+
+
+def test_unknown_engine(interval_inputs) -> None:
+    """
+    Ensures that an error is raised when an unknown engine is requested.
+    :param interval_inputs: A set of all types of interval overlaps.
+    :return: None
+    """
+
+    with pytest.raises(ValueError):
+        Merge.union(interval_inputs[0], engine="quadratic")
+
+
 def test_complex_interval_types(complex_interval_inputs, complex_interval_outputs) -> None:
     """
     For each of the available input types, tests whether the output is correct.
@@ -386,3 +485,796 @@ def test_alternate_attribute_key(interval_inputs) -> None:
         out = Merge.union(i, key="items")
         for j in out:
             assert "items" in j.keys()
+
+
+@pytest.mark.parametrize("engine", ["sweep", "graph"])
+def test_merge_duplicates(engine) -> None:
+    """
+    Ensures that any number of intervals spanning the same range are folded into a single interval.
+    :param engine: The engine used to merge the intervals.
+    :return: None
+    """
+
+    intervals = [
+        {"start": datetime.datetime(2020, 1, 1, 1, 0, 0), "finish": datetime.datetime(2020, 1, 4, 1, 0, 0),
+         "set_items": {str(i)}} for i in range(3)
+    ]
+    intervals.append(
+        {"start": datetime.datetime(2020, 1, 2, 1, 0, 0), "finish": datetime.datetime(2020, 1, 3, 1, 0, 0),
+         "set_items": {"3"}}
+    )
+
+    unique, collapsed = Merge.merge_duplicates(intervals)
+    assert collapsed == 2
+    assert [u["set_items"] for u in unique] == [{"0", "1", "2"}, {"3"}]
+
+    # the original intervals are left untouched
+    assert intervals[0]["set_items"] == {"0"}
+
+    out = Merge.union(intervals, engine=engine)
+    assert out == [
+        {"start": datetime.datetime(2020, 1, 1, 1, 0, 0), "finish": datetime.datetime(2020, 1, 2, 1, 0, 0),
+         "set_items": {"0", "1", "2"}},
+        {"start": datetime.datetime(2020, 1, 2, 1, 0, 0), "finish": datetime.datetime(2020, 1, 3, 1, 0, 0),
+         "set_items": {"0", "1", "2", "3"}},
+        {"start": datetime.datetime(2020, 1, 3, 1, 0, 0), "finish": datetime.datetime(2020, 1, 4, 1, 0, 0),
+         "set_items": {"0", "1", "2"}}
+    ]
+
+
+def test_union_arrays(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that the columnar API produces the same segments as the list of dictionaries API.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    np = pytest.importorskip("numpy")
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+
+        # encode the labels of each interval as integer codes
+        vocabulary = sorted(set().union(*(j["set_items"] for j in i)))
+        codes = [vocabulary.index(item) for j in i for item in sorted(j["set_items"])]
+        offsets = np.cumsum([0] + [len(j["set_items"]) for j in i])
+
+        starts, finishes, (out_codes, out_offsets) = Merge.union_arrays(
+            np.array([j["start"] for j in i], dtype="datetime64[us]"),
+            np.array([j["finish"] for j in i], dtype="datetime64[us]"),
+            (np.array(codes), offsets)
+        )
+
+        assert len(starts) == len(finishes) == len(out_offsets) - 1 == len(o)
+        for n, j in enumerate(o):
+            assert starts[n].astype(datetime.datetime) == j["start"]
+            assert finishes[n].astype(datetime.datetime) == j["finish"]
+            assert {vocabulary[c] for c in out_codes[out_offsets[n]:out_offsets[n + 1]]} == j["set_items"]
+
+
+def test_union_arrays_mismatched_lengths() -> None:
+    """
+    Ensures that an error is raised when the columnar inputs do not line up.
+    :return: None
+    """
+
+    np = pytest.importorskip("numpy")
+
+    with pytest.raises(ValueError):
+        Merge.union_arrays(np.array([1, 2]), np.array([3]), (np.array([0]), np.array([0, 1])))
+
+
+def test_bitset_labels(interval_inputs, interval_outputs, complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that merging with bitset label sets produces the same output as merging with regular sets.
+    :param interval_inputs: A set of all types of interval overlaps.
+    :param interval_outputs: A set of outputs for all types of interval overlaps.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    for i, o in zip(interval_inputs + complex_interval_inputs, interval_outputs + complex_interval_outputs):
+        out = Merge.union(i, bitset=True)
+        assert out == o
+        for j in out:
+            assert isinstance(j["set_items"], LabelSet)
+
+    # the label sets support the usual set operations
+    labels = Merge.union(complex_interval_inputs[0], bitset=True)
+    assert "1" in labels[1]["set_items"] and "4" not in labels[1]["set_items"]
+    assert len(labels[1]["set_items"]) == 3
+    assert labels[0]["set_items"] | labels[3]["set_items"] == {"1", "2"}
+    assert labels[1]["set_items"] & {"1", "4"} == {"1"}
+
+    # bitset label sets are only available to the sweep engine
+    with pytest.raises(ValueError):
+        Merge.union(interval_inputs[0], engine="graph", bitset=True)
+
+
+def test_incremental_merge(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that merging intervals incrementally produces the same output as merging them all at once, and that
+    merged intervals are emitted as soon as the watermark passes their finish.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        merge = IncrementalMerge()
+        out = list(merge.extend(i)) + merge.flush()
+        assert out == o
+        assert merge.open_intervals == 0
+
+    # B starts after A, but C starts at the same time as B and ends before. D starts at the end time of C and ends last.
+    merge = IncrementalMerge()
+    intervals = complex_interval_inputs[4]
+    assert merge.push(intervals[0]) == []
+    assert merge.push(intervals[1]) == complex_interval_outputs[4][:1]
+    assert merge.push(intervals[2]) == []
+    assert merge.push(intervals[3]) == complex_interval_outputs[4][1:3]
+    assert merge.watermark == intervals[3]["start"]
+    assert merge.open_intervals == 2
+    assert merge.flush() == complex_interval_outputs[4][3:]
+
+
+def test_incremental_merge_order(interval_inputs) -> None:
+    """
+    Ensures that an error is raised when intervals are not pushed in order of their start time.
+    :param interval_inputs: A set of all types of interval overlaps.
+    :return: None
+    """
+
+    merge = IncrementalMerge()
+    merge.push(interval_inputs[0][1])
+    with pytest.raises(ValueError):
+        merge.push(interval_inputs[0][0])
+
+
+def test_shard() -> None:
+    """
+    Ensures that intervals are only split into shards where no interval is open.
+    :return: None
+    """
+
+    intervals = [
+        {"start": 0, "finish": 4, "set_items": {"1"}},
+        {"start": 2, "finish": 5, "set_items": {"2"}},
+        {"start": 5, "finish": 6, "set_items": {"3"}},
+        {"start": 7, "finish": 9, "set_items": {"4"}},
+    ]
+
+    assert Merge.shard(intervals, 2) == [intervals[:2], intervals[2:]]
+    assert Merge.shard(intervals, 4) == [intervals[:2], intervals[2:3], intervals[3:]]
+    assert Merge.shard(intervals, 1) == [intervals]
+    assert Merge.shard([], 4) == [[]]
+
+
+@pytest.mark.parametrize("bitset", [False, True])
+def test_parallel_union(bitset) -> None:
+    """
+    Ensures that merging in a pool of processes produces the same output as merging in a single process.
+    :param bitset: Whether labels are carried through the merge as bitmasks.
+    :return: None
+    """
+
+    intervals = list()
+    for n in range(400):
+        start = datetime.datetime(2020, 1, 1) + datetime.timedelta(hours=(n // 4) * 7 + n % 4)
+        intervals.append({"start": start, "finish": start + datetime.timedelta(hours=3), "set_items": {str(n % 5)}})
+
+    expected = Merge.union([dict(i) for i in intervals])
+    assert Merge.union([dict(i) for i in intervals], bitset=bitset, workers=3) == expected
+
+    # parallel merges are only available to the sweep engine
+    with pytest.raises(ValueError):
+        Merge.union(intervals, engine="graph", workers=3)
+
+
+def test_merged_timeline_queries(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that the output of a merge answers point and range queries, and still behaves like a list.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    # B starts after A, but C starts at the same time as B and ends before. D starts at the end time of C and ends last.
+    out = Merge.union(complex_interval_inputs[4])
+    assert isinstance(out, MergedTimeline)
+    assert out == complex_interval_outputs[4]
+    assert list(out) == complex_interval_outputs[4]
+
+    # point queries include the start of an interval but not its finish
+    assert out.at(datetime.datetime(2020, 1, 1, 1, 0, 0)) == {"1"}
+    assert out.at(datetime.datetime(2020, 1, 5, 0, 0, 0)) == {"2", "3"}
+    assert out.at(datetime.datetime(2020, 1, 5, 1, 0, 0)) == {"2", "4"}
+    assert out.at(datetime.datetime(2020, 1, 8, 1, 0, 0)) == set()
+    assert out.at(datetime.datetime(2019, 12, 31, 0, 0, 0)) == set()
+    assert out.segment_at(datetime.datetime(2020, 1, 3, 0, 0, 0)) == complex_interval_outputs[4][1]
+
+    # range queries return every interval overlapping [start, finish)
+    assert out.overlapping(datetime.datetime(2020, 1, 4, 1, 0, 0), datetime.datetime(2020, 1, 6, 1, 0, 0)) == \
+        complex_interval_outputs[4][2:4]
+    assert out.overlapping(datetime.datetime(2020, 1, 3, 0, 0, 0), datetime.datetime(2020, 1, 3, 1, 0, 0)) == \
+        complex_interval_outputs[4][1:2]
+    assert out.overlapping(datetime.datetime(2020, 1, 9, 0, 0, 0), datetime.datetime(2020, 1, 10, 0, 0, 0)) == []
+    assert out.labels_between(datetime.datetime(2020, 1, 4, 0, 0, 0), datetime.datetime(2020, 1, 5, 6, 0, 0)) == \
+        {"1", "2", "3", "4"}
+
+
+@pytest.mark.parametrize("engine", ["sweep", "graph"])
+def test_merge_stats(complex_interval_inputs, complex_interval_outputs, engine) -> None:
+    """
+    Ensures that the timings and counters of a merge are reported when requested.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :param engine: The engine used to merge the intervals.
+    :return: None
+    """
+
+    # B starts after A, C starts at the same time as B and ends at the same time as B
+    intervals = complex_interval_inputs[2]
+    intervals[0]["set_items"] = sorted(intervals[0]["set_items"])
+
+    stats = MergeStats()
+    with pytest.warns(UserWarning):
+        out = Merge.union(intervals, engine=engine, stats=stats)
+    assert out == complex_interval_outputs[2]
+
+    assert stats.engine == engine
+    assert stats.intervals_in == 3
+    assert stats.converted == 1
+    assert stats.duplicates == 1
+    assert stats.segments_out == 3
+    assert set(stats.phases) == ({"convert", "duplicates", "sort", "merge", "export"} if engine == "sweep" else
+                                 {"convert", "duplicates", "merge", "export"})
+    assert all(seconds >= 0 for seconds in stats.phases.values())
+    if engine == "sweep":
+        assert stats.peak_open_intervals == 2
+        assert stats.splits == {}
+    else:
+        assert stats.peak_open_intervals is None
+        assert sum(stats.splits.values()) >= 1
+    assert stats.as_dict()["segments_out"] == 3
+
+
+def test_networkx_is_imported_lazily() -> None:
+    """
+    Ensures that importing the package and merging with the sweep engine does not import NetworkX.
+    :return: None
+    """
+
+    code = (
+        "import sys\n"
+        "from mieda.intervals import Merge\n"
+        "Merge.union([{'start': 1, 'finish': 2, 'set_items': {'1'}}])\n"
+        "assert 'networkx' not in sys.modules\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def test_to_networkx(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that the merged intervals can be exported as a directed graph.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    pytest.importorskip("networkx")
+
+    graph = Merge.union(complex_interval_inputs[4]).to_networkx()
+    edges = sorted(graph.edges(data=True), key=lambda x: x[0])
+    assert [{"start": e[0], "finish": e[1], "set_items": e[2]["set_items"]} for e in edges] == \
+        complex_interval_outputs[4]
+
+
+@pytest.mark.parametrize("engine", ["sweep", "graph"])
+def test_union_does_not_mutate(complex_interval_inputs, engine) -> None:
+    """
+    Ensures that merging leaves the input list and the intervals in it untouched, even when sets are converted and
+    duplicates are folded, and that editing the merged intervals does not edit the input.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param engine: The engine used to merge the intervals.
+    :return: None
+    """
+
+    for i in complex_interval_inputs:
+        i[0]["set_items"] = sorted(i[0]["set_items"])
+        before = copy.deepcopy(i)
+        identities = [id(j) for j in i]
+
+        with pytest.warns(UserWarning):
+            out = Merge.union(i, engine=engine)
+
+        assert i == before
+        assert [id(j) for j in i] == identities
+
+        # the merged intervals share no sets with the input, so they can be edited freely
+        for j in out:
+            j["set_items"].add("X")
+        assert i == before
+
+
+@pytest.mark.parametrize("engine", ["sweep", "graph"])
+def test_interval_records(complex_interval_inputs, complex_interval_outputs, engine) -> None:
+    """
+    Ensures that Interval records are accepted and emitted in place of dictionaries.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :param engine: The engine used to merge the intervals.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        records = [Interval(j["start"], j["finish"], j["set_items"]) for j in i]
+        out = Merge.union(records, engine=engine)
+        assert out == [Interval(j["start"], j["finish"], j["set_items"]) for j in o]
+        assert out.at(o[0]["start"]) == o[0]["set_items"]
+
+    interval = Interval(1, 2, {"1"})
+    assert (interval.start, interval["finish"], interval["set_items"]) == (1, 2, {"1"})
+    assert not hasattr(interval, "__dict__")
+
+    # records hold no group or other fields to aggregate
+    with pytest.raises(ValueError):
+        Merge.union_by([interval])
+    with pytest.raises(ValueError):
+        Merge.union([interval], aggregate="max", field="severity")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_union_by(complex_interval_inputs, complex_interval_outputs, workers) -> None:
+    """
+    Ensures that merging many groups in a single call matches merging each group on its own.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :param workers: The number of processes to merge with.
+    :return: None
+    """
+
+    intervals = list()
+    for group, i in enumerate(complex_interval_inputs):
+        for j in i:
+            intervals.append(dict(j, channel="channel_{}".format(group)))
+
+    out = Merge.union_by(intervals, group_key="channel", workers=workers)
+    assert list(out) == ["channel_{}".format(group) for group in range(len(complex_interval_inputs))]
+    for group, o in enumerate(complex_interval_outputs):
+        assert isinstance(out["channel_{}".format(group)], MergedTimeline)
+        assert out["channel_{}".format(group)] == o
+
+    assert Merge.union_by([]) == {}
+
+
+def test_aggregates(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that aggregates carry a single reduced value for each merged interval instead of a set.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        for severity, j in enumerate(i):
+            j["severity"] = severity
+
+        def spans(out):
+            return [(j["start"], j["finish"]) for j in out]
+
+        count = Merge.union(i, aggregate="count")
+        assert spans(count) == spans(o)
+        assert [j["set_items"] for j in count] == [len(j["set_items"]) for j in o]
+
+        # the severity of each interval is its position, and each label is the position of its interval plus one
+        # (except for label 'A')
+        highest = Merge.union(i, aggregate="max", field="severity")
+        assert [j["set_items"] for j in highest] == [max(int(k) for k in j["set_items"] if k != "A") - 1 for j in o]
+        lowest = Merge.union(i, aggregate="min", field="severity")
+        assert [j["set_items"] for j in lowest] == [min(int(k) for k in j["set_items"] if k != "A") - 1 for j in o]
+
+        combined = Merge.union(i, aggregate=lambda a, b: a | b)
+        assert combined == o
+
+    # identical spans keep the values of every interval rather than being folded beforehand
+    intervals = [{"start": 1, "finish": 2, "set_items": {"1"}, "severity": s} for s in (3, 9, 5)]
+    assert Merge.union(intervals, aggregate="max", field="severity") == [{"start": 1, "finish": 2, "set_items": 9}]
+
+    with pytest.raises(ValueError):
+        Merge.union(intervals, aggregate="max")
+    with pytest.raises(ValueError):
+        Merge.union(intervals, aggregate="median", field="severity")
+    with pytest.raises(ValueError):
+        Merge.union(intervals, aggregate="count", bitset=True)
+    with pytest.raises(ValueError):
+        Merge.union(intervals, aggregate="count", engine="graph")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_coalesce(workers) -> None:
+    """
+    Ensures that merged intervals are coalesced, bridged and filtered inside the sweep.
+    :param workers: the number of worker processes to merge with.
+    :return: None
+    """
+
+    intervals = [
+        {"start": 1, "finish": 3, "set_items": {"1"}},
+        {"start": 2, "finish": 4, "set_items": {"1"}},
+        {"start": 4, "finish": 5, "set_items": {"1"}},
+        {"start": 6, "finish": 8, "set_items": {"1"}},
+        {"start": 8, "finish": 12, "set_items": {"2"}},
+        {"start": 12, "finish": 13, "set_items": {"2"}},
+        {"start": 20, "finish": 21, "set_items": {"3"}}
+    ]
+
+    assert Merge.union(intervals, coalesce_equal=True, workers=workers) == [
+        {"start": 1, "finish": 5, "set_items": {"1"}},
+        {"start": 6, "finish": 8, "set_items": {"1"}},
+        {"start": 8, "finish": 13, "set_items": {"2"}},
+        {"start": 20, "finish": 21, "set_items": {"3"}}
+    ]
+    assert Merge.union(intervals, coalesce_equal=True, max_gap=1, workers=workers) == [
+        {"start": 1, "finish": 8, "set_items": {"1"}},
+        {"start": 8, "finish": 13, "set_items": {"2"}},
+        {"start": 20, "finish": 21, "set_items": {"3"}}
+    ]
+    # without coalescing, gaps are bridged by extending the earlier interval
+    assert Merge.union(intervals, max_gap=1, workers=workers)[3] == {"start": 4, "finish": 6, "set_items": {"1"}}
+    assert Merge.union(intervals, coalesce_equal=True, min_duration=2, workers=workers) == [
+        {"start": 1, "finish": 5, "set_items": {"1"}},
+        {"start": 6, "finish": 8, "set_items": {"1"}},
+        {"start": 8, "finish": 13, "set_items": {"2"}}
+    ]
+
+    # streaming emits the same intervals, holding back at most one of them
+    incremental = IncrementalMerge(coalesce_equal=True, max_gap=1)
+    out = [m for i in intervals for m in incremental.push(i)]
+    assert out + incremental.flush() == Merge.union(intervals, coalesce_equal=True, max_gap=1)
+
+    with pytest.raises(ValueError):
+        Merge.union(intervals, coalesce_equal=True, engine="graph")
+
+
+def test_union_frame(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that merging a DataFrame matches merging the same intervals as dictionaries.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    pd = pytest.importorskip("pandas")
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        frame = pd.DataFrame({
+            "start": [j["start"] for j in i], "finish": [j["finish"] for j in i],
+            "label": [sorted(j["set_items"]) for j in i]
+        })
+
+        out = Merge.union_frame(frame, explode=False)
+        assert list(out.columns) == ["start", "finish", "label"]
+        assert [{"start": r.start, "finish": r.finish, "set_items": r.label} for r in out.itertuples()] == o
+
+        exploded = Merge.union_frame(frame)
+        assert isinstance(exploded["label"].dtype, pd.CategoricalDtype)
+        assert len(exploded) == sum(len(j["set_items"]) for j in o)
+        assert exploded.groupby("start", sort=True)["label"].apply(set).tolist() == [j["set_items"] for j in o]
+
+    # a single label per row, with rows missing a label ignored
+    frame = pd.DataFrame({"begin": [1, 1, 5, 7], "end": [4, 3, 6, 9], "channel": ["a", "b", "a", None]})
+    out = Merge.union_frame(frame, start="begin", finish="end", label="channel")
+    assert list(out.columns) == ["begin", "end", "channel"]
+    assert out.values.tolist() == [[1, 3, "a"], [1, 3, "b"], [3, 4, "a"], [5, 6, "a"]]
+    out = Merge.union_frame(frame, start="begin", finish="end", label="channel", explode=False)
+    assert list(out.columns) == ["begin", "end", "channel"]
+    assert out["channel"].tolist() == [{"a", "b"}, {"a"}, {"a"}]
+
+    # timezone-aware columns come back in their timezone
+    frame["begin"] = pd.to_datetime(frame["begin"], unit="h").dt.tz_localize("US/Pacific")
+    frame["end"] = pd.to_datetime(frame["end"], unit="h").dt.tz_localize("US/Pacific")
+    out = Merge.union_frame(frame, start="begin", finish="end", label="channel")
+    assert list(out.columns) == ["begin", "end", "channel"]
+    assert out["begin"].tolist() == pd.to_datetime([1, 1, 3, 5], unit="h").tz_localize("US/Pacific").tolist()
+
+
+def test_union_runs() -> None:
+    """
+    Ensures that runs of sampled labels and flags are extracted as intervals and merged.
+    :return: None
+    """
+
+    np = pytest.importorskip("numpy")
+
+    times = np.arange(10)
+    columns = {
+        "flag": np.array([0, 1, 1, 0, 0, 1, 1, 1, 0, 1], dtype=bool),
+        "Class": np.array([1, 1, 4, 4, 4, 1, 1, 5, 5, 5])
+    }
+
+    starts, finishes, (codes, offsets), vocabulary = Merge.runs(times, columns, ignore=(1,))
+    assert starts.tolist() == [1, 5, 9, 2, 7]
+    assert finishes.tolist() == [3, 8, 10, 5, 10]
+    assert [vocabulary[c] for c in codes.tolist()] == ["flag", "flag", "flag", ("Class", 4), ("Class", 5)]
+    assert offsets.tolist() == list(range(6))
+
+    assert Merge.union_runs(times, columns, ignore=(1,)) == [
+        {"start": 1, "finish": 2, "set_items": {"flag"}},
+        {"start": 2, "finish": 3, "set_items": {"flag", ("Class", 4)}},
+        {"start": 3, "finish": 5, "set_items": {("Class", 4)}},
+        {"start": 5, "finish": 7, "set_items": {"flag"}},
+        {"start": 7, "finish": 8, "set_items": {"flag", ("Class", 5)}},
+        {"start": 8, "finish": 9, "set_items": {("Class", 5)}},
+        {"start": 9, "finish": 10, "set_items": {"flag", ("Class", 5)}}
+    ]
+    assert Merge.union_runs(times, {"flag": columns["flag"]}, finish=12)[-1] == {
+        "start": 9, "finish": 12, "set_items": {"flag"}
+    }
+
+    # sample times in datetime64 come back as datetime objects
+    times = np.arange("2020-01-01T00", "2020-01-01T03", dtype="datetime64[h]").astype("datetime64[ns]")
+    assert Merge.union_runs(times, {"flag": np.array([1, 1, 0], dtype=bool)}) == [
+        {"start": datetime.datetime(2020, 1, 1, 0), "finish": datetime.datetime(2020, 1, 1, 2), "set_items": {"flag"}}
+    ]
+
+    with pytest.raises(ValueError):
+        Merge.runs(np.array([2, 1]), {"flag": np.array([1, 1], dtype=bool)})
+    with pytest.raises(ValueError):
+        Merge.runs(np.array([1, 2]), {"flag": np.array([1], dtype=bool)})
+
+    # a single sample has no spacing to infer its end from
+    with pytest.raises(ValueError):
+        Merge.union_runs(np.array([5]), {"flag": np.array([True])})
+    assert Merge.union_runs(np.array([5]), {"flag": np.array([True])}, finish=6) == [
+        {"start": 5, "finish": 6, "set_items": {"flag"}}
+    ]
+
+
+def test_dynamic_timeline(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that inserting and removing intervals leaves the same merged intervals as merging them from scratch.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        assert DynamicTimeline(i) == o
+
+        timeline = DynamicTimeline()
+        for j in i:
+            timeline.insert(j)
+        assert timeline == o
+
+        # retract the intervals one at a time
+        for n, j in enumerate(i):
+            timeline.remove(j)
+            assert timeline == Merge.union(i[n + 1:])
+        assert len(timeline) == 0 and timeline.edges == {}
+
+    timeline = DynamicTimeline.from_timeline(Merge.union([
+        {"start": 1, "finish": 4, "set_items": {"1"}},
+        {"start": 6, "finish": 8, "set_items": {"1"}}
+    ]))
+    timeline.insert({"start": 2, "finish": 7, "set_items": {"2"}})
+    assert timeline.at(5) == {"2"}
+    assert isinstance(timeline.to_timeline(), MergedTimeline)
+    timeline.remove({"start": 2, "finish": 7, "set_items": {"2"}})
+    assert timeline == [{"start": 1, "finish": 4, "set_items": {"1"}}, {"start": 6, "finish": 8, "set_items": {"1"}}]
+
+    # removing an interval which is not in the timeline leaves it untouched
+    with pytest.raises(ValueError):
+        timeline.remove({"start": 2, "finish": 7, "set_items": {"1"}})
+    with pytest.raises(ValueError):
+        timeline.remove({"start": 1, "finish": 4, "set_items": {"2"}})
+    assert timeline == [{"start": 1, "finish": 4, "set_items": {"1"}}, {"start": 6, "finish": 8, "set_items": {"1"}}]
+
+    # an interval spanning two adjacent inserted intervals with the same labels was never inserted itself
+    timeline = DynamicTimeline()
+    timeline.insert({"start": 0, "finish": 5, "set_items": {"a"}})
+    timeline.insert({"start": 5, "finish": 10, "set_items": {"a"}})
+    with pytest.raises(ValueError):
+        timeline.remove({"start": 0, "finish": 10, "set_items": {"a"}})
+    timeline.insert({"start": 2, "finish": 8, "set_items": {"b"}})
+    timeline.remove({"start": 0, "finish": 5, "set_items": {"a"}})
+    timeline.remove({"start": 5, "finish": 10, "set_items": {"a"}})
+    assert timeline == Merge.union([{"start": 2, "finish": 8, "set_items": {"b"}}])
+    assert timeline.edges == {2: 1, 8: 1}
+
+    # an interval without labels still covers its range, as it does in Merge.union
+    timeline.insert({"start": 7, "finish": 9, "set_items": set()})
+    assert timeline == Merge.union([{"start": 2, "finish": 8, "set_items": {"b"}},
+                                    {"start": 7, "finish": 9, "set_items": set()}])
+    timeline.remove({"start": 7, "finish": 9, "set_items": set()})
+    assert timeline == [{"start": 2, "finish": 8, "set_items": {"b"}}]
+
+
+def test_epoch_times(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that timestamps merged as integer nanoseconds are converted back to the timestamps they came from, or
+    kept as integers when asked.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    epoch = datetime.datetime(1970, 1, 1)
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        out = Merge.union(i, times="epoch")
+        assert [j["set_items"] for j in out] == [j["set_items"] for j in o]
+        assert [j["start"] for j in out] == [(j["start"] - epoch) // datetime.timedelta(microseconds=1) * 1000
+                                             for j in o]
+
+    # aware timestamps are converted from their timezone
+    zone = datetime.timezone(datetime.timedelta(hours=-7))
+    intervals = [{"start": datetime.datetime(1970, 1, 1, tzinfo=zone),
+                  "finish": datetime.datetime(1970, 1, 1, 1, tzinfo=zone), "set_items": {"1"}}]
+    assert Merge.union(intervals, times="epoch") == [
+        {"start": 7 * 3600 * 10 ** 9, "finish": 8 * 3600 * 10 ** 9, "set_items": {"1"}}
+    ]
+
+    with pytest.raises(ValueError):
+        Merge.union(intervals, times="seconds")
+
+    np = pytest.importorskip("numpy")
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        intervals = [dict(j, start=np.datetime64(j["start"], "ns"), finish=np.datetime64(j["finish"], "ns"))
+                     for j in i]
+        out = Merge.union(intervals, coalesce_equal=True, max_gap=np.timedelta64(1, "h"))
+        assert all(isinstance(j["start"], np.datetime64) for j in out)
+        microseconds = [dict(j, start=j["start"].astype("datetime64[us]").item(),
+                             finish=j["finish"].astype("datetime64[us]").item()) for j in out]
+        assert microseconds == Merge.union(i, coalesce_equal=True, max_gap=datetime.timedelta(hours=1))
+
+    # timestamps of different types are converted one at a time and still come back as they were
+    pd = pytest.importorskip("pandas")
+    intervals = [
+        {"start": pd.Timestamp(2020, 1, 1), "finish": np.datetime64("2020-01-03"), "set_items": {"1"}},
+        {"start": datetime.datetime(2020, 1, 2), "finish": pd.Timestamp(2020, 1, 4), "set_items": {"2"}}
+    ]
+    out = Merge.union(intervals)
+    assert [type(j["start"]) for j in out] == [pd.Timestamp, datetime.datetime, np.datetime64]
+    assert [j["set_items"] for j in out] == [{"1"}, {"1", "2"}, {"2"}]
+
+    # naive and aware timestamps cannot be merged together, with or without the conversion
+    intervals = [
+        {"start": datetime.datetime(2020, 1, 1), "finish": datetime.datetime(2020, 1, 3), "set_items": {"1"}},
+        {"start": datetime.datetime(2020, 1, 2, tzinfo=datetime.timezone.utc),
+         "finish": datetime.datetime(2020, 1, 4, tzinfo=datetime.timezone.utc), "set_items": {"2"}}
+    ]
+    for times in ("native", "epoch"):
+        with pytest.raises(TypeError):
+            Merge.union(intervals, times=times)
+    with pytest.raises(TypeError):
+        Merge.union([dict(intervals[0], start=pd.Timestamp(2020, 1, 1)), intervals[1]])
+    with pytest.raises(TypeError):
+        Merge.union([intervals[0], dict(intervals[1], start=pd.Timestamp(2020, 1, 2, tz="UTC"))])
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_union_several_keys(complex_interval_inputs, complex_interval_outputs, workers) -> None:
+    """
+    Ensures that merging on several keys in one sweep carries the union of every key in each merged interval.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :param workers: the number of worker processes to merge with.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        # the second key holds the labels of the first, tagged
+        intervals = [dict(j, tags={"tag_" + k for k in j["set_items"]}) for j in i]
+        out = Merge.union(intervals, key=["set_items", "tags"], workers=workers)
+        assert [{k: v for k, v in j.items() if k != "tags"} for j in out] == o
+        assert [j["tags"] for j in out] == [{"tag_" + k for k in j["set_items"]} for j in o]
+
+    intervals = [
+        {"start": 1, "finish": 4, "sensors": {"a"}, "detectors": set()},
+        {"start": 2, "finish": 3, "sensors": set(), "detectors": {"x"}},
+        {"start": 2, "finish": 3, "sensors": {"b"}, "detectors": {"y"}},
+    ]
+    timeline = Merge.union(intervals, key=["sensors", "detectors"], workers=workers)
+    assert timeline == [
+        {"start": 1, "finish": 2, "sensors": {"a"}, "detectors": set()},
+        {"start": 2, "finish": 3, "sensors": {"a", "b"}, "detectors": {"x", "y"}},
+        {"start": 3, "finish": 4, "sensors": {"a"}, "detectors": set()}
+    ]
+    assert timeline.at(2) == {"sensors": {"a", "b"}, "detectors": {"x", "y"}}
+    assert timeline.at(5) == {"sensors": set(), "detectors": set()}
+    assert timeline.labels_between(0, 10) == {"sensors": {"a", "b"}, "detectors": {"x", "y"}}
+    assert Merge.union_by([dict(j, group=1) for j in intervals], key=["sensors", "detectors"])[1] == timeline
+
+    with pytest.raises(ValueError):
+        Merge.union(intervals, key=["sensors", "detectors"], engine="graph")
+    with pytest.raises(ValueError):
+        Merge.union(intervals, key=["sensors", "detectors"], aggregate="count")
+
+
+def test_timeline_pyramid(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that each level of a pyramid preserves the coverage of every label, and that queries pick a level which
+    resolves the range into enough buckets.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    timeline = Merge.union([
+        {"start": 0, "finish": 6, "set_items": {"a"}},
+        {"start": 4, "finish": 8, "set_items": {"b"}},
+        {"start": 12, "finish": 16, "set_items": {"a"}}
+    ])
+    pyramid = TimelinePyramid(timeline, base=2)
+    assert len(pyramid.levels) == 4
+
+    # a bucket two units wide at level 0, and eight units wide at level 2
+    assert pyramid.query(0, 16, 8) == [
+        {"start": 0, "finish": 2, "set_items": {"a": 1.0}},
+        {"start": 2, "finish": 4, "set_items": {"a": 1.0}},
+        {"start": 4, "finish": 6, "set_items": {"a": 1.0, "b": 1.0}},
+        {"start": 6, "finish": 8, "set_items": {"b": 1.0}},
+        {"start": 12, "finish": 14, "set_items": {"a": 1.0}},
+        {"start": 14, "finish": 16, "set_items": {"a": 1.0}}
+    ]
+    assert pyramid.query(0, 16, 2) == [
+        {"start": 0, "finish": 8, "set_items": {"a": 0.75, "b": 0.5}},
+        {"start": 8, "finish": 16, "set_items": {"a": 0.5}}
+    ]
+    assert pyramid.query(9, 15, 1) == [{"start": 12, "finish": 16, "set_items": {"a": 1.0}}]
+    # narrower than a bucket per unit of width, so the merged intervals themselves are returned
+    assert pyramid.level_for(3, 5, 10) == -1
+    assert pyramid.query(3, 5, 10) == [
+        {"start": 0, "finish": 4, "set_items": {"a": 1.0}},
+        {"start": 4, "finish": 6, "set_items": {"a": 1.0, "b": 1.0}}
+    ]
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        pyramid = TimelinePyramid(Merge.union(i))
+        hours = datetime.timedelta(hours=1)
+        for label in set().union(*(j["set_items"] for j in o)):
+            covered = sum((j["finish"] - j["start"]) / pyramid.base for j in o if label in j["set_items"])
+            for _, coverage in pyramid.levels:
+                assert sum(c.get(label, 0.0) for c in coverage) == pytest.approx(covered)
+        assert pyramid.query(o[0]["start"], o[-1]["finish"], 1)[0]["start"] == o[0]["start"]
+        assert pyramid.query(o[0]["start"], o[0]["start"] + hours, 10 ** 6)[0] == dict(
+            o[0], set_items=dict.fromkeys(o[0]["set_items"], 1.0)
+        )
+
+    assert TimelinePyramid([]).query(0, 1, 10) == []
+
+
+def test_union_merged(complex_interval_inputs, complex_interval_outputs) -> None:
+    """
+    Ensures that merging timelines which were already merged gives the same merged intervals as merging all of the
+    original intervals at once.
+    :param complex_interval_inputs: A set of complex interval overlaps.
+    :param complex_interval_outputs: A set of outputs for all complex interval overlaps.
+    :return: None
+    """
+
+    for i, o in zip(complex_interval_inputs, complex_interval_outputs):
+        # every interval merged on its own, and the intervals split into two halves
+        assert Merge.union_merged([Merge.union([j]) for j in i]) == o
+        assert Merge.overlay(Merge.union(i[::2]), Merge.union(i[1::2])) == o
+        assert Merge.union_merged([Merge.union(i), []]) == o
+
+    a = Merge.union([
+        {"start": 1, "finish": 4, "sensors": {"a"}, "detectors": set()},
+        {"start": 6, "finish": 8, "sensors": {"a"}, "detectors": {"x"}}
+    ], key=["sensors", "detectors"])
+    b = Merge.union([{"start": 3, "finish": 6, "sensors": {"b"}, "detectors": {"y"}}], key=["sensors", "detectors"])
+    assert Merge.overlay(a, b) == [
+        {"start": 1, "finish": 3, "sensors": {"a"}, "detectors": set()},
+        {"start": 3, "finish": 4, "sensors": {"a", "b"}, "detectors": {"y"}},
+        {"start": 4, "finish": 6, "sensors": {"b"}, "detectors": {"y"}},
+        {"start": 6, "finish": 8, "sensors": {"a"}, "detectors": {"x"}}
+    ]
+    # the sets of the input timelines are copied rather than shared
+    assert Merge.overlay(a, [])[0]["sensors"] is not a[0]["sensors"]
+
+    records = Merge.union_merged([Merge.union([Interval(1, 3, {"a"})]), Merge.union([Interval(2, 4, {"b"})])])
+    assert [(j.start, j.finish, j.items) for j in records] == [(1, 2, {"a"}), (2, 3, {"a", "b"}), (3, 4, {"b"})]
+    assert Merge.union_merged([]) == []
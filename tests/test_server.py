@@ -0,0 +1,163 @@
+# Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
+# License: Apache 2.0
+
+from mieda.cli import parser
+from mieda.intervals import Merge
+from mieda.server import Client, MergeServer
+
+import asyncio
+import datetime
+import pytest
+import threading
+
+
+# fixtures
+@pytest.fixture()
+def server() -> MergeServer:
+    """
+    This fixture runs a MergeServer on a free local port in a background thread.
+    :return: the running MergeServer.
+    """
+
+    server = MergeServer(port=0, workers=2, linger=0.01)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    yield server
+
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+# tests
+def test_client_union(server, random_intervals) -> None:
+    """
+    Ensures that intervals merged by the server match those merged by Merge.union.
+    :param server: A running MergeServer.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :return: None
+    """
+
+    with Client(*server.address) as client:
+        assert client.union(random_intervals) == Merge.union(random_intervals)
+        assert client.union(random_intervals, coalesce_equal=True) == Merge.union(random_intervals,
+                                                                                  coalesce_equal=True)
+        assert client.union([]) == []
+
+        # timestamps survive the round trip
+        intervals = [{"start": datetime.datetime(2020, 1, 1, 1), "finish": datetime.datetime(2020, 1, 2),
+                      "set_items": {"1"}}]
+        assert client.union(intervals) == intervals
+
+        # durations are sent in seconds and applied to timestamps as timedeltas
+        intervals = [{"start": datetime.datetime(2020, 1, 1, 1), "finish": datetime.datetime(2020, 1, 1, 2),
+                      "set_items": {"1"}},
+                     {"start": datetime.datetime(2020, 1, 1, 3), "finish": datetime.datetime(2020, 1, 1, 3, 5),
+                      "set_items": {"1"}}]
+        bridged = Merge.union(intervals, max_gap=datetime.timedelta(hours=1), coalesce_equal=True)
+        assert len(bridged) == 1
+        assert client.union(intervals, max_gap=datetime.timedelta(hours=1), coalesce_equal=True) == bridged
+        assert client.union(intervals, max_gap=3600, coalesce_equal=True) == bridged
+        assert client.union(intervals, min_duration=datetime.timedelta(minutes=10)) == intervals[:1]
+        assert client.union(random_intervals, max_gap=2) == Merge.union(random_intervals, max_gap=2)
+
+        # a request which fails is reported without closing the connection
+        with pytest.raises(ValueError):
+            client.union([{"start": 1, "finish": 2, "set_items": {"1"}}, {"start": "1", "finish": "2",
+                                                                          "set_items": {"1"}}])
+        with pytest.raises(ValueError):
+            client.union(random_intervals, aggregate="count")
+        assert client.union(random_intervals) == Merge.union(random_intervals)
+
+
+def test_client_union_arrays(server) -> None:
+    """
+    Ensures that intervals sent in columnar form are merged as by Merge.union_arrays.
+    :param server: A running MergeServer.
+    :return: None
+    """
+
+    np = pytest.importorskip("numpy")
+
+    starts, finishes = np.array([1, 1, 6]), np.array([4, 3, 8])
+    labels = (np.array([0, 1, 0]), np.array([0, 1, 2, 3]))
+    with Client(*server.address) as client:
+        out = client.union_arrays(starts, finishes, labels)
+    expected = Merge.union_arrays(starts, finishes, labels)
+    assert out[0].tolist() == expected[0].tolist()
+    assert out[1].tolist() == expected[1].tolist()
+    assert out[2][0].tolist() == expected[2][0].tolist()
+    assert out[2][1].tolist() == expected[2][1].tolist()
+
+
+def test_requests_are_batched(server, random_intervals) -> None:
+    """
+    Ensures that concurrent requests from several clients are merged in shared batches.
+    :param server: A running MergeServer.
+    :param random_intervals: A set of randomly overlapping intervals.
+    :return: None
+    """
+
+    expected = Merge.union(random_intervals)
+    results = list()
+
+    def run():
+        with Client(*server.address) as client:
+            for _ in range(3):
+                results.append(client.union(random_intervals) == expected)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [True] * 24
+    assert server.requests == 24
+    assert server.batches < 24
+
+
+def test_cli_parser() -> None:
+    """
+    Ensures that the 'serve' command parses its options.
+    :return: None
+    """
+
+    args = parser().parse_args(["serve", "--port", "9000", "--workers", "2"])
+    assert (args.command, args.port, args.workers, args.host) == ("serve", 9000, 2, "127.0.0.1")
+    with pytest.raises(SystemExit):
+        parser().parse_args([])
+
+
+def test_batches_are_spread_over_workers() -> None:
+    """
+    Ensures that a batch of requests is split into about one chunk per worker process.
+    :return: None
+    """
+
+    server = MergeServer(workers=4)
+    server._size = 4
+    chunks = list()
+
+    async def dispatch_chunk(chunk):
+        chunks.append(len(chunk))
+
+    async def dispatch(n):
+        await server._dispatch([(None, None)] * n)
+
+    server._dispatch_chunk = dispatch_chunk
+    for n in (1, 3, 10, 64):
+        asyncio.run(dispatch(n))
+    assert chunks == [1, 1, 1, 1, 3, 3, 3, 1, 16, 16, 16, 16]
+    assert server.requests == 78 and server.batches == 4
@@ -0,0 +1,100 @@
+# Authors: Valentino Constantinou <vconstan@jpl.caltech.edu>, Asitang Mishra <asitang.mishra@jpl.caltech.edu>
+# License: Apache 2.0
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from mieda.intervals import Merge, MergedTimeline
+from mieda.storage import load, save, save_arrays, StoredTimeline
+
+import datetime
+
+
+# fixtures
+@pytest.fixture()
+def timeline() -> MergedTimeline:
+    """
+    This fixture merges a small set of overlapping intervals with timestamps.
+    :return: the merged intervals.
+    """
+
+    return Merge.union([
+        {"start": datetime.datetime(2020, 1, 1, 1, 0, 0), "finish": datetime.datetime(2020, 1, 4, 1, 0, 0),
+         "set_items": {"1"}},
+        {"start": datetime.datetime(2020, 1, 2, 1, 0, 0), "finish": datetime.datetime(2020, 1, 6, 1, 0, 0),
+         "set_items": {"2", "3"}},
+        {"start": datetime.datetime(2020, 1, 7, 1, 0, 0), "finish": datetime.datetime(2020, 1, 8, 1, 0, 0),
+         "set_items": set()}
+    ])
+
+
+# tests
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(timeline, tmp_path, mmap) -> None:
+    """
+    Ensures that saved merged intervals are loaded back unchanged, with or without memory-mapping.
+    :param timeline: A set of merged intervals.
+    :param tmp_path: A temporary directory to save to.
+    :param mmap: Whether the arrays are memory-mapped.
+    :return: None
+    """
+
+    save(timeline, str(tmp_path / "timeline"))
+    stored = load(str(tmp_path / "timeline"), mmap=mmap)
+
+    assert isinstance(stored, StoredTimeline)
+    assert isinstance(stored.starts, np.memmap) is mmap
+    assert len(stored) == len(timeline)
+    assert stored == timeline
+    assert stored[-1] == timeline[-1]
+    assert stored[1:3] == timeline[1:3]
+    assert stored.to_timeline() == timeline
+
+    # queries are answered directly from the arrays
+    for time in (datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 3), datetime.datetime(2020, 1, 4, 1),
+                 datetime.datetime(2020, 1, 7, 1), datetime.datetime(2020, 1, 9)):
+        assert stored.at(time) == timeline.at(time)
+    assert stored.overlapping(datetime.datetime(2020, 1, 3), datetime.datetime(2020, 1, 7, 2)) == \
+        timeline.overlapping(datetime.datetime(2020, 1, 3), datetime.datetime(2020, 1, 7, 2))
+
+
+def test_save_arrays(tmp_path) -> None:
+    """
+    Ensures that the output of the columnar API can be saved and loaded back.
+    :param tmp_path: A temporary directory to save to.
+    :return: None
+    """
+
+    starts, finishes, (codes, offsets) = Merge.union_arrays(
+        np.array([1, 2]), np.array([4, 6]), (np.array([0, 1]), np.array([0, 1, 2]))
+    )
+    save_arrays(str(tmp_path), starts, finishes, codes, offsets, vocabulary=["a", "b"], key="labels")
+
+    assert load(str(tmp_path)) == [
+        {"start": 1, "finish": 2, "labels": {"a"}},
+        {"start": 2, "finish": 4, "labels": {"a", "b"}},
+        {"start": 4, "finish": 6, "labels": {"b"}}
+    ]
+
+
+def test_round_trip_tuple_labels(tmp_path) -> None:
+    """
+    Ensures that tuple labels, such as those of Merge.union_runs, are loaded back as tuples, and that labels or keys
+    which cannot be saved are rejected.
+    :param tmp_path: A temporary directory to save to.
+    :return: None
+    """
+
+    timeline = Merge.union_runs(np.arange(6), {"detector": np.array([0, 1, 1, 0, 1, 1], dtype=bool),
+                                               "Class": np.array([1, 1, 4, 4, 1, 1])}, ignore=(1,))
+    save(timeline, str(tmp_path / "runs"))
+    stored = load(str(tmp_path / "runs"))
+    assert stored[1] == {"start": 2, "finish": 3, "set_items": {"detector", ("Class", 4)}}
+    assert stored == timeline
+    assert stored.at(3) == {("Class", 4)}
+
+    with pytest.raises(ValueError):
+        save(Merge.union([{"start": 1, "finish": 2, "set_items": {frozenset("a")}}]), str(tmp_path / "frozen"))
+    with pytest.raises(ValueError):
+        save(Merge.union([{"start": 1, "finish": 2, "a": {"x"}, "b": {"y"}}], key=["a", "b"]), str(tmp_path / "keys"))